@@ -35,8 +35,10 @@ class ExtendedEnum(Enum):
 class ModelT(str, ExtendedEnum):
     prophet = "prophet"
     holt_winters = "holt_winters"
+    holt_winters_batched = "holt_winters_batched"
     auto_arima = "auto_arima"
     sarimax = "sarimax"
+    ar_batched = "ar_batched"
 
 
 class UnivariateModelT(str, ExtendedEnum):
@@ -44,6 +46,7 @@ class UnivariateModelT(str, ExtendedEnum):
     auto_arima = "auto_arima"
     prophet = "prophet"
     holt_winters = "holt_winters"
+    holt_winters_batched = "holt_winters_batched"
     sarimax = "sarimax"
 
 
@@ -67,11 +70,14 @@ class NAryTreeT(metaclass=abc.ABCMeta):
     Type definition of an NAryTree
     """
 
+    __slots__ = ()
+
     key: str
     item: Union[pandas.Series, pandas.DataFrame]
-    exogenous: List[str] = None
+    exogenous: List[str]
     children: List[Optional["NAryTreeT"]]
     _parent: "Optional[ReferenceType[NAryTreeT]]"
+    _index: Optional[Any]
     visualizer: HierarchyVisualizerT
 
     @property
@@ -85,11 +91,21 @@ class NAryTreeT(metaclass=abc.ABCMeta):
             yield child
 
     def __getstate__(self):
-        self._parent = None
-        return self.__dict__
+        state = {
+            name: getattr(self, name)
+            for cls in type(self).__mro__
+            for name in getattr(cls, "__slots__", ())
+            if name != "__weakref__" and hasattr(self, name)
+        }
+        state.update(getattr(self, "__dict__", {}))
+        state["_parent"] = None
+        state["_index"] = None
+        return state
 
     def __setstate__(self, state):
-        self.__dict__ = state
+        state.setdefault("_index", None)
+        for name, value in state.items():
+            setattr(self, name, value)
         for child in self.children:
             child._parent = weakref.ref(self)
 
@@ -180,6 +196,8 @@ class MethodT(ExtendedEnum):
     OLS = "OLS"
     WLSS = "WLSS"
     WLSV = "WLSV"
+    MINT_SAMPLE = "MINT_SAMPLE"
+    MINT_SHRINK = "MINT_SHRINK"
     FP = "FP"
     PHA = "PHA"
     AHP = "AHP"
@@ -2,9 +2,10 @@ from typing import Dict, Optional, Union
 
 import numpy
 import pandas
+from scipy import sparse
 
 from hts._t import ArrayLike, MethodT, NAryTreeT, TransformT
-from hts.functions import to_sum_mat
+from hts.functions import to_sparse_sum_mat, to_sum_mat
 from hts.revision import RevisionMethod
 
 
@@ -79,9 +80,10 @@ def revise_forecasts(
     forecasts: Dict[str, ArrayLike],
     errors: Optional[Dict[str, float]] = None,
     residuals: Optional[Dict[str, ArrayLike]] = None,
-    summing_matrix: numpy.ndarray = None,
+    summing_matrix: Union[numpy.ndarray, sparse.spmatrix] = None,
     nodes: NAryTreeT = None,
     transformer: TransformT = None,
+    sparse_sum_mat: bool = False,
 ):
     """
     Convenience function to get revised forecast for pre-computed base forecasts
@@ -98,17 +100,23 @@ def revise_forecasts(
         ``residuals`` is not passed
     residuals : Dict[str, ArrayLike]
         A dict mapping key name to the residuals of in-sample forecasts. Required for methods: ``OLS``, ``WLSS``,
-        ``WLSV``, can be of type ``numpy.ndarray`` of ndim == 1, ``pandas.Series``, or single columned
+        ``WLSV`` if ``errors`` is not passed, and always required for ``MINT_SAMPLE``, ``MINT_SHRINK``. Can be of type ``numpy.ndarray`` of ndim == 1, ``pandas.Series``, or single columned
         ``pandas.DataFrame``. If passing residuals, ``errors`` dict is not required and will instead be calculated
         using MSE metric: ``numpy.mean(numpy.array(residual) ** 2)``
-    summing_matrix : numpy.ndarray
-        Not required if ``nodes`` argument is passed, or if using ``BU`` approach
+    summing_matrix : Union[numpy.ndarray, scipy.sparse.spmatrix]
+        Not required if ``nodes`` argument is passed, or if using ``BU`` approach. A sparse summing matrix, as
+        returned by :py:func:`hts.functions.to_sparse_sum_mat`, is consumed as is; its rows must follow the order
+        of the ``forecasts`` dict
     nodes : NAryTreeT
         The tree of nodes as specified in :py:class:`HierarchyTree <hts.hierarchy.HierarchyTree>`. Required if not
         if using ``AHP``, ``PHA``, ``FP`` methods, or if using  passing the ``OLS``, ``WLSS``, ``WLSV`` methods
         and not passing the ``summing_matrix`` parameter
     transformer : TransformT
         A transform with the method: ``inv_func`` that will be applied to the forecasts
+    sparse_sum_mat : bool
+        If True and ``nodes`` is passed, the summing matrix is built with
+        :py:func:`hts.functions.to_sparse_sum_mat`, in which case the ``forecasts`` dict must follow the level
+        order of the tree
 
     Returns
     -------
@@ -117,7 +125,14 @@ def revise_forecasts(
     """
 
     if nodes:
-        summing_matrix, sum_mat_labels = to_sum_mat(nodes)
+        if sparse_sum_mat:
+            summing_matrix, sum_mat_labels = to_sparse_sum_mat(nodes)
+        elif method in [MethodT.MINT_SAMPLE.name, MethodT.MINT_SHRINK.name]:
+            # Rows of S must follow the order of the forecasts and residuals
+            summing_matrix, sum_mat_labels = to_sparse_sum_mat(nodes)
+            summing_matrix = summing_matrix.toarray()
+        else:
+            summing_matrix, sum_mat_labels = to_sum_mat(nodes)
 
     if method in [MethodT.AHP.name, MethodT.PHA.name, MethodT.FP.name] and not nodes:
         raise ValueError(f"Method {method} requires an NAryTree to be passed")
@@ -130,10 +145,17 @@ def revise_forecasts(
                 f"well as an NAryTree or a summing matrix"
             )
 
+    if method in [MethodT.MINT_SAMPLE.name, MethodT.MINT_SHRINK.name]:
+        if not residuals:
+            raise ValueError(f"Method {method} requires residuals to be passed")
+        residuals = _sanitize_residuals_dict(residuals)
+
     revision = RevisionMethod(
         name=method, sum_mat=summing_matrix, transformer=transformer
     )
     sanitized_forecasts = _sanitize_forecasts_dict(forecasts)
-    revised = revision.revise(forecasts=sanitized_forecasts, mse=errors, nodes=nodes)
+    revised = revision.revise(
+        forecasts=sanitized_forecasts, mse=errors, nodes=nodes, residuals=residuals
+    )
 
     return pandas.DataFrame(revised, columns=list(sanitized_forecasts.keys()))
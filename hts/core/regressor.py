@@ -5,6 +5,7 @@ from typing import Any, Dict, List, Optional, Union
 
 import numpy
 import pandas
+from scipy import sparse
 from sklearn.base import BaseEstimator, RegressorMixin
 
 from hts import defaults
@@ -12,11 +13,16 @@ from hts import model as hts_models
 from hts._t import ExogT, MethodT, ModelT, NodesT, TimeSeriesModelT, Transform
 from hts.core.exceptions import InvalidArgumentException, MissingRegressorException
 from hts.core.result import HTSResult
-from hts.core.utils import _do_fit, _do_predict, _model_mapping_to_iterable
-from hts.functions import to_sum_mat
+from hts.core.utils import (
+    _do_fit,
+    _do_predict,
+    _load_serialized_model,
+    _model_mapping_to_iterable,
+)
+from hts.functions import to_sparse_sum_mat, to_sum_mat
 from hts.hierarchy import HierarchyTree
 from hts.hierarchy.utils import make_iterable
-from hts.model.base import TimeSeriesModel
+from hts.model.base import BatchedTimeSeriesModel, TimeSeriesModel
 from hts.revision import RevisionMethod
 from hts.utilities.distribution import DistributorBaseClass
 
@@ -39,6 +45,9 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
     sum_mat : array_like
         The summing matrix, explained in depth in `Forecasting <https://otexts.com/fpp2/gts.html>`_
 
+    sparse_sum_mat : bool
+        Whether the summing matrix is built as a ``scipy.sparse.csr_matrix``
+
     nodes : Dict[str, List[str]]
         Nodes representing node, edges of the hierarchy. Keys are nodes, values are list of edges.
 
@@ -46,7 +55,7 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
         The dataframe containing the nodes and edges specified above
 
     revision_method : str
-        One of: ``"OLS", "WLSS", "WLSV", "FP", "PHA", "AHP", "BU", "NONE"``
+        One of: ``"OLS", "WLSS", "WLSV", "MINT_SAMPLE", "MINT_SHRINK", "FP", "PHA", "AHP", "BU", "NONE"``
 
     models : dict
         Dictionary that holds the trained models
@@ -72,6 +81,8 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
         transform: Optional[Union[Transform, bool]] = False,
         n_jobs: int = defaults.N_PROCESSES,
         low_memory: bool = defaults.LOW_MEMORY,
+        sparse_sum_mat: bool = defaults.SPARSE_SUM_MAT,
+        warm_start: bool = defaults.WARM_START,
         **kwargs: Any,
     ):
         """
@@ -79,8 +90,10 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
         ----------
         model : str
             One of the models supported by ``hts``. These can be found
+            in ``hts.model.MODEL_MAPPING``. Batched models, e.g. ``holt_winters_batched``, fit all the nodes at
+            once in the calling process, ``n_jobs``, ``low_memory`` and distributors do not apply to them
         revision_method : str
-            The revision method to be used. One of: ``"OLS", "WLSS", "WLSV", "FP", "PHA", "AHP", "BU", "NONE"``
+            The revision method to be used. One of: ``"OLS", "WLSS", "WLSV", "MINT_SAMPLE", "MINT_SHRINK", "FP", "PHA", "AHP", "BU", "NONE"``
         transform : Boolean or NamedTuple
             If True, ``scipy.stats.boxcox`` and ``scipy.special._ufuncs.inv_boxcox`` will be applied prior and after
             fitting.
@@ -105,6 +118,15 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
         low_memory : Bool
             If True, models will be fit, serialized, and released from memory. Usually a good idea if
             you are dealing with a large amount of nodes
+        sparse_sum_mat : Bool
+            If True, the summing matrix is derived from the structure of the tree and stored as a sparse matrix,
+            see :py:func:`hts.functions.to_sparse_sum_mat`. Usually a good idea for hierarchies with a large
+            amount of leaves
+        warm_start : Bool
+            If True, each call to ``fit`` seeds the model of every node with the model of the previous fit, e.g.
+            for nightly refits on slightly extended data: ``sarimax`` starts optimizing from the previous
+            parameters, and ``auto_arima`` reuses the previously selected order, searching again every
+            ``search_every`` fits or when the fit degrades by more than ``search_tolerance``
         kwargs
             Keyword arguments to be passed to the underlying model to be instantiated
         """
@@ -118,8 +140,10 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
         else:
             self.tmp_dir = None
         self.transform = transform
+        self.sparse_sum_mat: bool = sparse_sum_mat
+        self.warm_start: bool = warm_start
 
-        self.sum_mat: Optional[numpy.ndarray] = None
+        self.sum_mat: Optional[Union[numpy.ndarray, sparse.spmatrix]] = None
         self.nodes: Optional[NodesT] = None
         self.model_instance: Optional[TimeSeriesModelT] = None
         self.exogenous: bool = False
@@ -148,7 +172,14 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
                 nodes=nodes, df=df, exogenous=exogenous, root=root
             )
         self.exogenous = exogenous
-        self.sum_mat, sum_mat_labels = to_sum_mat(self.nodes)
+        if self.sparse_sum_mat:
+            self.sum_mat, sum_mat_labels = to_sparse_sum_mat(self.nodes)
+        elif self.method in [MethodT.MINT_SAMPLE.name, MethodT.MINT_SHRINK.name]:
+            # Rows of S must follow the order of the forecasts and residuals
+            sum_mat, sum_mat_labels = to_sparse_sum_mat(self.nodes)
+            self.sum_mat = sum_mat.toarray()
+        else:
+            self.sum_mat, sum_mat_labels = to_sum_mat(self.nodes)
         self._set_model_instance()
         self._init_revision()
 
@@ -165,6 +196,20 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
                 f'Model {self.model} not valid. Pick one of: {" ".join(ModelT.names())}'
             )
 
+    def _warm_start_states(self) -> Dict[str, Any]:
+        states = {}
+        for key, model in self.hts_result.models.items():
+            if isinstance(model, tuple):
+                model = _load_serialized_model(tmp_dir=self.tmp_dir, file_name=model[1])
+            if isinstance(model, TimeSeriesModel):
+                states[key] = model.get_warm_start()
+        return states
+
+    def _batched(self) -> bool:
+        return isinstance(self.model_instance, type) and issubclass(
+            self.model_instance, BatchedTimeSeriesModel
+        )
+
     def fit(
         self,
         df: Optional[pandas.DataFrame] = None,
@@ -218,7 +263,17 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
 
         self.__init_hts(nodes=nodes, df=df, tree=tree, root=root, exogenous=exogenous)
 
-        nodes = make_iterable(self.nodes, prop=None)
+        # Models only need the data of their own node
+        nodes = [node.detached() for node in make_iterable(self.nodes, prop=None)]
+
+        if self._batched():
+            # A single model fits all the nodes at once
+            model = self.model_instance(
+                nodes=nodes, transform=self.transform, **self.model_args
+            ).fit(**fit_kwargs)
+            for node in nodes:
+                self.hts_result.models = (node.key, model)
+            return self
 
         fit_function_kwargs = {
             "fit_kwargs": fit_kwargs,
@@ -227,6 +282,7 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
             "model_instance": self.model_instance,
             "model_args": self.model_args,
             "transform": self.transform,
+            "warm_start": self._warm_start_states() if self.warm_start else {},
         }
 
         fitted_models = _do_fit(
@@ -249,9 +305,13 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
         self, exogenous_df: pandas.DataFrame
     ) -> Optional[pandas.DataFrame]:
         if exogenous_df is not None:
-            if self.model not in [ModelT.prophet.value, ModelT.auto_arima.value]:
+            if self.model not in [
+                ModelT.prophet.value,
+                ModelT.auto_arima.value,
+                ModelT.ar_batched.value,
+            ]:
                 logger.warning(
-                    "Providing `exogenous_df` with a model that is not `prophet` or `auto_arima` has no effect"
+                    "Providing `exogenous_df` with a model that is not `prophet`, `auto_arima` or `ar_batched` has no effect"
                 )
         if self.exogenous and exogenous_df is None:
             raise MissingRegressorException(
@@ -305,7 +365,7 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
             Any arguments to be passed to the underlying forecasting model's predict function
         exogenous_df : pandas.DataFrame
             A dataframe of length == steps_ahead containing the exogenous data for each of the nodes.
-            Only required when using ``prophet`` or ``auto_arima`` models. See
+            Only required when using ``prophet``, ``auto_arima`` or ``ar_batched`` models. See
             `fbprophet's additional regression docs <https://facebook.github.io/prophet/docs/seasonality,_holiday_effects,_and_regressors.html#additional-regressors>`_
             and
             `AutoARIMA's exogenous handling docs <https://alkaline-ml.com/pmdarima/modules/generated/pmdarima.arima.AutoARIMA.html>`_
@@ -336,15 +396,24 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
             "predict_kwargs": predict_kwargs,
         }
 
-        fit_models = _model_mapping_to_iterable(self.hts_result.models, self.nodes)
-        results = _do_predict(
-            models=fit_models,
-            function_kwargs=predict_function_kwargs,
-            n_jobs=self.n_jobs,
-            disable_progressbar=disable_progressbar,
-            show_warnings=show_warnings,
-            distributor=distributor,
-        )
+        if self._batched():
+            model = self.hts_result.models[self.nodes.key].predict(
+                node=self.nodes, steps_ahead=steps_ahead, **predict_kwargs
+            )
+            results = [
+                (key, model.forecasts[key], model.errors[key], model.residuals[key])
+                for key in model.keys
+            ]
+        else:
+            fit_models = _model_mapping_to_iterable(self.hts_result.models, self.nodes)
+            results = _do_predict(
+                models=fit_models,
+                function_kwargs=predict_function_kwargs,
+                n_jobs=self.n_jobs,
+                disable_progressbar=disable_progressbar,
+                show_warnings=show_warnings,
+                distributor=distributor,
+            )
         for key, forecast, error, residual in results:
             self.hts_result.forecasts = (key, forecast)
             self.hts_result.errors = (key, error)
@@ -357,6 +426,7 @@ class HTSRegressor(BaseEstimator, RegressorMixin):
             forecasts=self.hts_result.forecasts,
             mse=self.hts_result.errors,
             nodes=self.nodes,
+            residuals=self.hts_result.residuals,
         )
 
         revised_columns = list(make_iterable(self.nodes))
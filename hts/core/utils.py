@@ -49,6 +49,7 @@ def _do_actual_fit(node: NAryTreeT, function_kwargs: Dict) -> ModelFitResultT:
         transform=function_kwargs["transform"],
         **function_kwargs["model_args"]
     )
+    instantiated_model.warm_start = function_kwargs.get("warm_start", {}).get(node.key)
     if not function_kwargs["low_memory"]:
         model_instance = instantiated_model.fit(**function_kwargs["fit_kwargs"])
         return model_instance
@@ -101,7 +102,7 @@ def _model_mapping_to_iterable(
             model = model_mapping[node.key][1]
         else:
             model = model_mapping[node.key]
-        prediction_triplet.append((node.key, model, node))
+        prediction_triplet.append((node.key, model, node.detached()))
     return prediction_triplet
 
 
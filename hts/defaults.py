@@ -8,7 +8,15 @@ n_cores = int(os.getenv("NUMBER_OF_CPUS") or cpu_count())
 MODEL = ModelT.prophet.value
 REVISION = MethodT.OLS.value
 LOW_MEMORY = False
+WARM_START = False
+# Fits of an AutoARIMA model between two order searches when warm starting, and
+# relative increase of the in-sample MSE that triggers a search anyway
+SEARCH_EVERY = 7
+SEARCH_TOLERANCE = 0.1
+SPARSE_SUM_MAT = False
+PROJECTION_CACHE_SIZE = 8
 CHUNKSIZE = None
+INGEST_CHUNKSIZE = 1_000_000
 N_PROCESSES = max(1, n_cores // 2)
 PROFILING = False
 DISABLE_PROGRESSBAR = False
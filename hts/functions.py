@@ -1,12 +1,30 @@
-from random import choice
-from typing import Dict, List, Tuple
+import logging
+import os
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 import pandas
+from numpy.linalg import LinAlgError
+from scipy import sparse
+from scipy.linalg import cho_factor, cho_solve, lu_factor, lu_solve
+from scipy.sparse.linalg import splu
 
+from hts import defaults
 from hts._t import MethodT, NAryTreeT
 from hts.hierarchy import make_iterable
 
+logger = logging.getLogger(__name__)
+
 
 def to_sum_mat(
     ntree: NAryTreeT = None, node_labels: List[str] = None
@@ -86,35 +104,507 @@ def to_sum_mat(
     return sum_mat, sum_mat_labels
 
 
+def _leaf_ranges(nodes: List[NAryTreeT]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Number the leaves of a tree in depth first order and record, for every node, the half-open range of
+    leaf numbers spanned by its descendants. Runs as a single iterative post-order pass, so it is linear in
+    the size of the tree and is not bound by the recursion limit.
+
+    Parameters
+    ----------
+    nodes : List[NAryTreeT]
+        All the nodes of the tree, root first, as returned by ``make_iterable(ntree, prop=None)``
+
+    Returns
+    -------
+    numpy.ndarray
+        Start of the leaf range of each node in ``nodes``
+
+    numpy.ndarray
+        End (exclusive) of the leaf range of each node in ``nodes``
+
+    numpy.ndarray
+        Position in ``nodes`` of each leaf, in depth first order
+    """
+    position = {id(node): i for i, node in enumerate(nodes)}
+    start = np.zeros(len(nodes), dtype=np.int64)
+    end = np.zeros(len(nodes), dtype=np.int64)
+    leaves: List[int] = []
+
+    stack = [(nodes[0], False)]
+    while stack:
+        node, visited = stack.pop()
+        i = position[id(node)]
+        if visited:
+            end[i] = len(leaves)
+            continue
+        start[i] = len(leaves)
+        if node.is_leaf():
+            leaves.append(i)
+            end[i] = len(leaves)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+    return start, end, np.array(leaves, dtype=np.int64)
+
+
+def to_sparse_sum_mat(ntree: NAryTreeT) -> Tuple[sparse.csr_matrix, List[str]]:
+    """
+    Sparse counterpart of :py:func:`to_sum_mat`. Membership is derived from the structure of the tree rather
+    than from the node labels: the leaves spanned by every node are recorded in a single post-order pass,
+    see :py:func:`_leaf_ranges`, so construction is linear in the size of the tree.
+
+    Rows follow the level order traversal of the tree, i.e. the order of ``make_iterable(ntree)``, which is
+    the order in which ``HTSRegressor`` produces its forecasts. Columns follow the level order of the leaves.
+
+    Parameters
+    ----------
+    ntree : NAryTreeT
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Summing matrix.
+
+    List[str]
+        Row order list of the node represented by each row in the summing matrix.
+
+    """
+    nodes = make_iterable(ntree, prop=None)
+    start, end, leaves = _leaf_ranges(nodes)
+
+    # Map depth first leaf numbers onto level order columns
+    columns = np.empty(len(leaves), dtype=np.int64)
+    columns[np.argsort(leaves)] = np.arange(len(leaves))
+
+    counts = end - start
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    indices = columns[np.repeat(start - indptr[:-1], counts) + np.arange(indptr[-1])]
+    sum_mat = sparse.csr_matrix(
+        (np.ones(len(indices)), indices, indptr), shape=(len(nodes), len(leaves))
+    )
+    sum_mat.sort_indices()
+    return sum_mat, [node.key for node in nodes]
+
+
+def to_grouped_sum_mat(
+    bottom: pandas.DataFrame, hierarchy: List[List[str]]
+) -> Tuple[sparse.csr_matrix, List[str]]:
+    """
+    Aggregate rows of the summing matrix of a grouped (or hierarchical) structure, as used by
+    :py:func:`get_hierarchichal_df`. Membership is derived from the level values of each bottom level
+    series rather than by matching the underscore delimited labels, so keys containing underscores or
+    being substrings of one another are handled correctly.
+
+    Parameters
+    ----------
+    bottom : pandas.DataFrame
+        One row per bottom level series, in column order of the summing matrix, and one column per level
+    hierarchy : List[List[str]]
+        Desired levels in your hierarchy, each level being a subset of the columns of ``bottom``
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        One row per aggregate series, one column per bottom level series.
+
+    List[str]
+        Underscore delimited labels of the aggregate series, in the same order as
+        :py:func:`get_agg_series`.
+    """
+    rows, cols, labels = [], [], []
+    columns = np.arange(len(bottom))
+    for level in hierarchy:
+        missing = [col for col in level if col not in bottom.columns]
+        if missing:
+            raise ValueError(f"Levels {missing} are not part of the bottom level")
+        # Groups are numbered in order of first appearance
+        codes = bottom.groupby(level, sort=False).ngroup().values
+        _, first = np.unique(codes, return_index=True)
+        rows.append(codes + len(labels))
+        cols.append(columns)
+        labels += ["_".join(map(str, key)) for key in bottom[level].values[first]]
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.array([], dtype=np.int64)
+    agg_mat = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(labels), len(bottom))
+    )
+    return agg_mat, labels
+
+
+def _bottom_rows(sum_mat: Union[np.ndarray, sparse.spmatrix]) -> np.ndarray:
+    """
+    Row index of the bottom level series for each column of the summing matrix. Aggregates having a
+    single child share their row with it, the leaf is always the last of those rows.
+
+    Parameters
+    ----------
+    sum_mat : Union[numpy.ndarray, scipy.sparse.spmatrix]
+        The summing matrix
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of length ``sum_mat.shape[1]``
+    """
+    sum_mat = sparse.csr_matrix(sum_mat)
+    single = np.flatnonzero(np.diff(sum_mat.indptr) == 1)
+    rows = np.full(sum_mat.shape[1], -1)
+    np.maximum.at(rows, sum_mat.indices[sum_mat.indptr[single]], single)
+    return rows
+
+
+def _scale_rows(
+    mat: Union[np.ndarray, sparse.spmatrix], values: np.ndarray
+) -> Union[np.ndarray, sparse.spmatrix]:
+    if sparse.issparse(mat):
+        return sparse.diags(values) @ mat
+    return mat * values[:, np.newaxis]
+
+
 def project(
-    hat_mat: np.ndarray, sum_mat: np.ndarray, optimal_mat: np.ndarray
+    hat_mat: np.ndarray,
+    sum_mat: Union[np.ndarray, sparse.spmatrix],
+    optimal_mat: Union[np.ndarray, sparse.spmatrix],
+    out: np.ndarray = None,
 ) -> np.ndarray:
-    new_mat = np.empty([hat_mat.shape[0], sum_mat.shape[0]])
-    for i in range(hat_mat.shape[0]):
-        new_mat[i, :] = np.dot(optimal_mat, np.transpose(hat_mat[i, :]))
-    return new_mat
+    """
+    Project every row (time step) of the forecasts with a single matrix product, i.e. computes
+    ``optimal_mat * y_t`` for all ``t`` at once.
+
+    Parameters
+    ----------
+    hat_mat : numpy.ndarray
+        Forecasts, one row per time step
+    sum_mat : Union[numpy.ndarray, scipy.sparse.spmatrix]
+        The summing matrix, only used to determine the number of output columns
+    optimal_mat : Union[numpy.ndarray, scipy.sparse.spmatrix]
+        The projection matrix, dense or sparse
+    out : numpy.ndarray
+        Optional preallocated buffer of shape ``(hat_mat.shape[0], sum_mat.shape[0])`` the result is written to
+
+    Returns
+    -------
+    numpy.ndarray
+        The projected forecasts, ``out`` if it was passed
+    """
+    shape = (hat_mat.shape[0], sum_mat.shape[0])
+    if out is None:
+        out = np.empty(shape)
+    elif out.shape != shape:
+        raise ValueError(f"`out` must be of shape {shape}, got {out.shape}")
+
+    if sparse.issparse(optimal_mat):
+        out[...] = (optimal_mat @ hat_mat.T).T
+    else:
+        np.matmul(hat_mat, optimal_mat.T, out=out)
+    return out
+
+
+def _forecast_values(forecast) -> np.ndarray:
+    values = getattr(forecast, "yhat", forecast)
+    return np.asarray(values, dtype=np.float64).ravel()
 
 
-def y_hat_matrix(forecasts, keys=None):
+def y_hat_matrix(
+    forecasts: Dict[str, Any], keys: Optional[List[str]] = None, out: np.ndarray = None
+) -> np.ndarray:
+    """
+    Assemble the forecasts of each node into a single ``(time steps, nodes)`` matrix. The matrix is
+    allocated once and its columns are filled in the order of ``keys``
+
+    Parameters
+    ----------
+    forecasts : Dict[str, Any]
+        Forecasts of each node, either as frames or series exposing a ``yhat`` column, or as plain arrays
+    keys : List[str]
+        Order of the columns, defaults to the order of ``forecasts``
+    out : numpy.ndarray
+        Optional preallocated buffer of shape ``(time steps, len(keys))``
+
+    Returns
+    -------
+    numpy.ndarray
+    """
     if not keys:
-        keys = forecasts.keys()
-    first = list(forecasts.keys())[0]
-    y_hat_mat = np.zeros([len(forecasts[first].yhat), 1])
-    for key in keys:
-        f1 = np.array(forecasts[key].yhat)
-        f2 = f1[:, np.newaxis]
-        if np.all(y_hat_mat == 0):
-            y_hat_mat = f2
+        keys = list(forecasts.keys())
+    first = _forecast_values(forecasts[keys[0]])
+    shape = (len(first), len(keys))
+    if out is None:
+        out = np.empty(shape, dtype=np.float64)
+    elif out.shape != shape:
+        raise ValueError(f"Output buffer has shape {out.shape}, expected {shape}")
+    out[:, 0] = first
+    for col, key in enumerate(keys[1:], start=1):
+        out[:, col] = _forecast_values(forecasts[key])
+    return out
+
+
+class CombinationFactor(NamedTuple):
+    """
+    Factorized form of the optimal combination ``S * inv(S' * inv(W) * S) * S' * inv(W)``, see
+    :py:func:`combination_factor`
+    """
+
+    weighted_sum_mat: Union[np.ndarray, sparse.spmatrix]
+    factor: Any
+    solver: str
+
+
+def _combination_weights(
+    sum_mat: Union[np.ndarray, sparse.spmatrix],
+    method: str,
+    mse: Dict[str, float] = None,
+) -> Optional[np.ndarray]:
+    if method == MethodT.OLS.name:
+        return None
+    elif method == MethodT.WLSS.name:
+        return np.asarray(sum_mat.sum(axis=1)).ravel()
+    elif method == MethodT.WLSV.name:
+        weights = np.hstack([mse[key] for key in mse.keys()]) + 0.0000001
+        # Rows of a sparse summing matrix follow the order of the forecasts
+        if not sparse.issparse(sum_mat):
+            weights = np.flip(weights, 0)
+        return weights
+    else:
+        raise ValueError("Invalid method")
+
+
+def _residual_matrix(residuals: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Stack the in-sample residuals into a ``(observations, nodes)`` matrix, in the order of the dict, dropping
+    the observations missing for any of the nodes.
+    """
+    res = np.column_stack([np.asarray(v, dtype=float) for v in residuals.values()])
+    return res[~np.isnan(res).any(axis=1)]
+
+
+def shrinkage_intensity(res: np.ndarray) -> float:
+    """
+    Shrinkage intensity of the residual covariance towards its diagonal, as in Schäfer and Strimmer
+    "A Shrinkage Approach to Large-Scale Covariance Matrix Estimation", used by ``MINT_SHRINK``.
+
+    All the sums over pairs of nodes are computed from ``(observations, observations)`` products, so the
+    ``(nodes, nodes)`` correlation matrix is never materialized.
+
+    Parameters
+    ----------
+    res : np.ndarray
+        In-sample residuals of shape ``(observations, nodes)``
+
+    Returns
+    -------
+    float
+        Shrinkage intensity, between 0 and 1
+    """
+    n_obs = res.shape[0]
+    scale = np.sqrt(np.mean(res ** 2, axis=0))
+    standardized = np.divide(res, scale, out=np.zeros_like(res), where=scale > 0)
+    squared = standardized ** 2
+
+    # Sums over i != j of the squared correlations and of their variances
+    col_sums = squared.sum(axis=0)
+    gram = standardized @ standardized.T
+    cross = np.sum(gram ** 2) - np.sum(col_sums ** 2)
+    squared_cross = np.sum(squared.sum(axis=1) ** 2) - np.sum(squared ** 2)
+
+    var_sum = (squared_cross - cross / n_obs) / (n_obs * (n_obs - 1))
+    corr_sum = cross / n_obs ** 2
+    if corr_sum <= 0:
+        return 1.0
+    return float(max(min(var_sum / corr_sum, 1.0), 0.0))
+
+
+def _mint_weighted_sum_mat(
+    sum_mat: Union[np.ndarray, sparse.spmatrix],
+    residuals: Dict[str, np.ndarray],
+    shrink: bool,
+) -> np.ndarray:
+    """
+    ``inv(W) * S`` for the MinT covariance estimates, ``W = lambda * D + (1 - lambda) * R' * R / T`` where ``D``
+    is the diagonal of the sample covariance and ``lambda`` is 0 for the sample estimate. When there are
+    more nodes than observations the shrinkage estimate is inverted as a diagonal plus low rank matrix,
+    through the Woodbury identity, so only ``(observations, observations)`` systems are solved.
+    """
+    res = _residual_matrix(residuals)
+    n_obs, n_nodes = res.shape
+    if n_nodes != sum_mat.shape[0]:
+        raise ValueError(
+            f"Residuals were provided for {n_nodes} nodes, the summing matrix has {sum_mat.shape[0]} rows"
+        )
+
+    if not shrink and n_nodes > n_obs:
+        raise ValueError(
+            f"The sample covariance of {n_nodes} nodes cannot be estimated from {n_obs} observations, "
+            f"use {MethodT.MINT_SHRINK.name} instead"
+        )
+    lam = shrinkage_intensity(res) if shrink else 0.0
+
+    if n_nodes <= n_obs:
+        dense = sum_mat.toarray() if sparse.issparse(sum_mat) else sum_mat
+        cov = res.T @ res / n_obs
+        cov = (1 - lam) * cov + lam * np.diag(np.diag(cov))
+        cov[np.diag_indices_from(cov)] += 0.0000001
+        return cho_solve(cho_factor(cov), dense)
+
+    # W = D + U * U'
+    diag = lam * np.mean(res ** 2, axis=0) + 0.0000001
+    low_rank = res.T * np.sqrt((1 - lam) / n_obs)
+    inv_diag_sum_mat = _scale_rows(sum_mat, 1 / diag)
+    if sparse.issparse(inv_diag_sum_mat):
+        inv_diag_sum_mat = inv_diag_sum_mat.toarray()
+    inv_diag_low_rank = low_rank / diag[:, np.newaxis]
+    core = np.identity(n_obs) + low_rank.T @ inv_diag_low_rank
+    correction = inv_diag_low_rank @ cho_solve(
+        cho_factor(core), low_rank.T @ inv_diag_sum_mat
+    )
+    return inv_diag_sum_mat - correction
+
+
+def combination_factor(
+    sum_mat: Union[np.ndarray, sparse.spmatrix],
+    method: str,
+    mse: Dict[str, float] = None,
+    residuals: Dict[str, np.ndarray] = None,
+) -> CombinationFactor:
+    """
+    Factorize the ``m x m`` bottom level system ``S' * inv(W) * S`` of the optimal combination, where ``m``
+    is the number of bottom level series. Dense systems use a Cholesky factorization, sparse ones a
+    sparse direct (LU) solver, so no ``n x n`` matrix nor explicit inverse is ever formed. The factor only
+    depends on the summing matrix, the method and, for ``WLSV`` and ``MINT_*``, the in-sample errors or
+    residuals, so it can be computed once and applied to any number of forecasts with
+    :py:func:`apply_combination`.
+
+    Parameters
+    ----------
+    sum_mat : Union[np.ndarray, scipy.sparse.spmatrix]
+        The summing  matrix
+    method : str
+        One of ``OLS``, ``WLSS``, ``WLSV``, ``MINT_SAMPLE``, ``MINT_SHRINK``
+    mse : Dict[str, float]
+        In-sample errors, only used by ``WLSV``
+    residuals : Dict[str, np.ndarray]
+        In-sample residuals, in the row order of the summing matrix. Only used by ``MINT_SAMPLE`` and
+        ``MINT_SHRINK``
+
+    Returns
+    -------
+    CombinationFactor
+    """
+    if method in [MethodT.MINT_SAMPLE.name, MethodT.MINT_SHRINK.name]:
+        if not residuals:
+            raise ValueError(f"Method {method} requires the in-sample residuals")
+        weighted = _mint_weighted_sum_mat(
+            sum_mat, residuals, shrink=method == MethodT.MINT_SHRINK.name
+        )
+    else:
+        weights = _combination_weights(sum_mat=sum_mat, method=method, mse=mse)
+        if weights is None:
+            weighted = sum_mat
         else:
-            y_hat_mat = np.concatenate((y_hat_mat, f2), axis=1)
-    return y_hat_mat
+            weighted = _scale_rows(sum_mat, 1 / weights)
+    gram = sum_mat.T @ weighted
+
+    if sparse.issparse(gram):
+        return CombinationFactor(
+            weighted_sum_mat=sparse.csr_matrix(weighted),
+            factor=splu(sparse.csc_matrix(gram)),
+            solver="splu",
+        )
+    try:
+        return CombinationFactor(
+            weighted_sum_mat=weighted, factor=cho_factor(gram), solver="cholesky"
+        )
+    except LinAlgError:
+        # Not numerically positive definite, fall back to a pivoted LU
+        return CombinationFactor(
+            weighted_sum_mat=weighted, factor=lu_factor(gram), solver="lu"
+        )
+
+
+def _solve(factor: CombinationFactor, rhs: np.ndarray) -> np.ndarray:
+    if factor.solver == "splu":
+        return factor.factor.solve(rhs)
+    elif factor.solver == "cholesky":
+        return cho_solve(factor.factor, rhs)
+    return lu_solve(factor.factor, rhs)
+
+
+def apply_combination(
+    hat_mat: np.ndarray,
+    sum_mat: Union[np.ndarray, sparse.spmatrix],
+    factor: CombinationFactor,
+    out: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Reconcile a block of forecasts, one row per time step, with a factor computed by
+    :py:func:`combination_factor`. The forecasts are first reduced to the bottom level system, solved, and then
+    summed back up, so the cost is linear in the number of nodes for a given number of bottom level series.
+
+    Parameters
+    ----------
+    hat_mat : np.ndarray
+        Forecasts, one row per time step and one column per row of the summing matrix
+    sum_mat : Union[np.ndarray, scipy.sparse.spmatrix]
+        The summing  matrix
+    factor : CombinationFactor
+        The factorized bottom level system
+    out : np.ndarray
+        Optional preallocated buffer the revised forecasts are written to, see :py:func:`project`
+
+    Returns
+    -------
+    np.ndarray
+        The revised forecasts
+    """
+    rhs = np.asarray(factor.weighted_sum_mat.T @ hat_mat.T)
+    bottom = _solve(factor, rhs)
+    return project(hat_mat=bottom.T, sum_mat=sum_mat, optimal_mat=sum_mat, out=out)
+
+
+def optimal_projection(
+    sum_mat: Union[np.ndarray, sparse.spmatrix],
+    method: str,
+    mse: Dict[str, float] = None,
+    residuals: Dict[str, np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Dense projection matrix ``S * inv(S' * inv(W) * S) * S' * inv(W)`` of the optimal combination. Prefer
+    :py:func:`combination_factor` and :py:func:`apply_combination` for large hierarchies, as this matrix is
+    of shape ``(n_nodes, n_nodes)``.
+
+    Parameters
+    ----------
+    sum_mat : Union[np.ndarray, scipy.sparse.spmatrix]
+        The summing  matrix
+    method : str
+        One of ``OLS``, ``WLSS``, ``WLSV``, ``MINT_SAMPLE``, ``MINT_SHRINK``
+    mse : Dict[str, float]
+        In-sample errors, only used by ``WLSV``
+    residuals : Dict[str, np.ndarray]
+        In-sample residuals, only used by ``MINT_SAMPLE`` and ``MINT_SHRINK``
+
+    Returns
+    -------
+    np.ndarray
+        Projection matrix of shape ``(n_nodes, n_nodes)``
+    """
+    factor = combination_factor(
+        sum_mat=sum_mat, method=method, mse=mse, residuals=residuals
+    )
+    weighted = factor.weighted_sum_mat
+    if sparse.issparse(weighted):
+        weighted = weighted.toarray()
+    return np.asarray(sum_mat @ _solve(factor, weighted.T))
 
 
 def optimal_combination(
     forecasts: Dict[str, pandas.DataFrame],
-    sum_mat: np.ndarray,
+    sum_mat: Union[np.ndarray, sparse.spmatrix],
     method: str,
     mse: Dict[str, float],
+    out: np.ndarray = None,
+    residuals: Dict[str, np.ndarray] = None,
 ):
     """
     Produces the optimal combination of forecasts by trace minimization (as described by
@@ -125,48 +615,31 @@ def optimal_combination(
     ----------
     forecasts : dict
         Dictionary of pandas.DataFrames containing the future predictions
-    sum_mat : np.ndarray
-        The summing  matrix
+    sum_mat : Union[np.ndarray, scipy.sparse.spmatrix]
+        The summing  matrix, either dense (see :py:func:`to_sum_mat`) or sparse (see
+        :py:func:`to_sparse_sum_mat`)
     method : str
         One of:
             - OLS (ordinary least squares)
             - WLSS (structurally weighted least squares)
             - WLSV (variance weighted least squares)
+            - MINT_SAMPLE (MinT, sample covariance of the in-sample residuals)
+            - MINT_SHRINK (MinT, shrinkage covariance of the in-sample residuals)
     mse
+    out : np.ndarray
+        Optional preallocated buffer the revised forecasts are written to, see :py:func:`project`
+    residuals : Dict[str, np.ndarray]
+        In-sample residuals, required by the ``MINT_SAMPLE`` and ``MINT_SHRINK`` methods
 
     Returns
     -------
 
     """
     hat_mat = y_hat_matrix(forecasts)
-    transpose = np.transpose(sum_mat)
-
-    if method == MethodT.OLS.name:
-        ols = np.dot(
-            np.dot(sum_mat, np.linalg.inv(np.dot(transpose, sum_mat))), transpose
-        )
-        return project(hat_mat=hat_mat, sum_mat=sum_mat, optimal_mat=ols)
-    elif method == MethodT.WLSS.name:
-        diag = np.diag(np.transpose(np.sum(sum_mat, axis=1)))
-    elif method == MethodT.WLSV.name:
-        diag = [mse[key] for key in mse.keys()]
-        diag = np.diag(np.flip(np.hstack(diag) + 0.0000001, 0))
-    else:
-        raise ValueError("Invalid method")
-
-    # S*inv(S'S)*S'
-    optimal_mat = np.dot(
-        np.dot(
-            np.dot(
-                sum_mat,
-                np.linalg.inv(np.dot(np.dot(transpose, np.linalg.inv(diag)), sum_mat)),
-            ),
-            transpose,
-        ),
-        np.linalg.inv(diag),
+    factor = combination_factor(
+        sum_mat=sum_mat, method=method, mse=mse, residuals=residuals
     )
-
-    return project(hat_mat=hat_mat, sum_mat=sum_mat, optimal_mat=optimal_mat)
+    return apply_combination(hat_mat=hat_mat, sum_mat=sum_mat, factor=factor, out=out)
 
 
 def proportions(nodes, forecasts, sum_mat, method=MethodT.PHA.name):
@@ -194,44 +667,55 @@ def proportions(nodes, forecasts, sum_mat, method=MethodT.PHA.name):
     return np.dot(np.array(fcst), np.transpose(props))
 
 
-def forecast_proportions(forecasts, nodes):
+def _parent_index(nodes: NAryTreeT) -> Tuple[List[str], np.ndarray, np.ndarray]:
     """
-    Cons:
-       Produces biased revised forecasts even if base forecasts are unbiased
+    Level order keys of the tree, with the position of the parent (``-1`` for the root) and the depth of each node
     """
-    n_cols = len(list(forecasts.keys())) + 1
+    order = make_iterable(nodes, prop=None)
+    position = {id(node): i for i, node in enumerate(order)}
+    parent = np.full(len(order), -1, dtype=np.intp)
+    depth = np.zeros(len(order), dtype=np.intp)
+    for i, node in enumerate(order):
+        for child in node.children:
+            parent[position[id(child)]] = i
+            depth[position[id(child)]] = depth[i] + 1
+    return [node.key for node in order], parent, depth
 
-    levels = nodes.get_height()
-    column = 0
-    first_node = 1
 
-    key = choice(list(forecasts.keys()))
-    new_mat = np.empty([len(forecasts[key].yhat), n_cols - 1])
-    new_mat[:, 0] = forecasts[key].yhat
+def forecast_proportions(forecasts, nodes):
+    """
+    Top-down revision, splitting the forecast of each parent among its children in proportion to the
+    children's own forecasts. Levels are revised one at a time, each with a handful of array operations.
+
+    Cons:
+       Produces biased revised forecasts even if base forecasts are unbiased
 
-    as_iterable = make_iterable(nodes, prop=None)
+    Parameters
+    ----------
+    forecasts : Dict[str, pandas.DataFrame]
+        Forecasts of each node
+    nodes : NAryTreeT
+        The hierarchy
 
-    for level in range(levels - 1):
-        for i, node in enumerate(nodes.level_order_traversal()[level]):
-            num_child = node
-            last_node = first_node + num_child
-            base_fcst = np.array(
-                [forecasts[k.key].yhat[:] for k in as_iterable[first_node:last_node]]
-            )
-            print(base_fcst.shape)
-            fore_sum = np.sum(base_fcst, axis=0)
-            fore_sum = fore_sum[:, np.newaxis]
-            if column == 0:
-                rev_top = np.array(forecasts["total"].yhat)
-                rev_top = rev_top[:, np.newaxis]
-            else:
-                rev_top = np.array(new_mat[:, column])
-                rev_top = rev_top[:, np.newaxis]
-            new_mat[:, first_node:last_node] = np.divide(
-                np.multiply(np.transpose(base_fcst), rev_top), fore_sum
-            )
-            column += 1
-            first_node += num_child
+    Returns
+    -------
+    numpy.ndarray
+        Revised forecasts, one column per node in level order
+    """
+    keys, parent, depth = _parent_index(nodes)
+    hat_mat = y_hat_matrix(forecasts, keys=keys)
+    new_mat = np.empty_like(hat_mat)
+    new_mat[:, depth == 0] = hat_mat[:, depth == 0]
+
+    for level in range(1, depth.max(initial=0) + 1):
+        children = np.flatnonzero(depth == level)
+        children = children[np.argsort(parent[children], kind="stable")]
+        parents, starts = np.unique(parent[children], return_index=True)
+        child_sums = np.add.reduceat(hat_mat[:, children], starts, axis=1)
+        group = np.searchsorted(parents, parent[children])
+        new_mat[:, children] = (
+            hat_mat[:, children] * new_mat[:, parent[children]] / child_sums[:, group]
+        )
     return new_mat
 
 
@@ -343,7 +827,9 @@ def get_hierarchichal_df(
     val_colname: str,
 ) -> Tuple[pandas.DataFrame, np.array, List[str]]:
     """
-    Transform your tabular dataframe to a wide dataframe with desired levels a hierarchy.
+    Transform your tabular dataframe to a wide dataframe with desired levels a hierarchy. Series and dates are
+    encoded as integer codes and all the aggregates are computed with a single sparse matrix product; the input
+    dataframe is left unchanged.
 
     Parameters
     ----------
@@ -420,25 +906,186 @@ def get_hierarchichal_df(
     # Column names separated by underscores
     level_names_underscores = "_".join(level_names)
 
-    # Create a column representing the bottom level of aggregation
-    df[level_names_underscores] = _create_bl_str_col(df, level_names)
-
-    # Pivot df to bottom level. We can create the aggregate these series to get all the higher levels.
-    forecast_df = df.pivot(
-        index=date_colname, columns=level_names_underscores, values=val_colname
+    # Bottom level series and dates as integer codes, the input frame is only read from
+    bottom_codes = df.groupby(level_names, sort=False).ngroup().values
+    _, first = np.unique(bottom_codes, return_index=True)
+    bottom = df[level_names].take(first).reset_index(drop=True)
+    bottom_levels = ["_".join(map(str, key)) for key in bottom.values]
+    date_codes, dates = pandas.factorize(df[date_colname], sort=True)
+
+    n_dates, n_bottom = len(dates), len(bottom_levels)
+    cells = date_codes * n_bottom + bottom_codes
+    counts = np.bincount(cells, minlength=n_dates * n_bottom)
+    if np.any(counts > 1):
+        raise ValueError("Index contains duplicate entries, cannot reshape")
+
+    values = df[val_colname].values
+    dtype = values.dtype if np.all(counts) else np.result_type(values.dtype, float)
+    bottom_mat = np.zeros((n_dates, n_bottom), dtype=dtype)
+    bottom_mat.flat[cells] = values
+
+    agg_mat, grouped_levels = to_grouped_sum_mat(bottom, hierarchy)
+
+    # Total and all the aggregates with a single sparse product
+    totals_mat = sparse.vstack([np.ones((1, n_bottom)), agg_mat]).tocsr().astype(dtype)
+    agg_values = np.asarray((totals_mat @ bottom_mat.T).T)
+    if not np.all(counts):
+        bottom_mat.flat[np.flatnonzero(counts == 0)] = np.nan
+
+    first_rows = {}
+    for i, label in enumerate(grouped_levels):
+        first_rows.setdefault(label, i)
+    agg_rows = list(first_rows.values())
+
+    # Bottom level columns are sorted by label, as a pivot on the bottom level would do
+    sorted_bottom = np.argsort(np.asarray(bottom_levels, dtype=object), kind="stable")
+    forecast_df = pandas.DataFrame(
+        np.hstack(
+            [
+                bottom_mat[:, sorted_bottom],
+                agg_values[:, [0] + [i + 1 for i in agg_rows]],
+            ]
+        ),
+        index=pandas.Index(dates, name=date_colname),
+        columns=pandas.Index(
+            [bottom_levels[i] for i in sorted_bottom]
+            + ["total"]
+            + list(first_rows.keys()),
+            name=level_names_underscores,
+        ),
     )
 
-    # Sum all bottom level series to get total
-    forecast_df["total"] = forecast_df.sum(axis=1)
+    # Same row order as to_sum_mat: total, aggregates in reverse order, then bottom level
+    agg_rows = list(reversed(agg_rows))
+    sum_mat = sparse.vstack(
+        [np.ones((1, n_bottom)), agg_mat[agg_rows], sparse.identity(n_bottom)]
+    ).toarray()
+    sum_mat_labels = ["total"] + [grouped_levels[i] for i in agg_rows] + bottom_levels
+
+    return forecast_df, sum_mat, sum_mat_labels
 
-    bottom_levels = list(df[level_names_underscores].unique())
 
-    grouped_levels = get_agg_series(df, hierarchy)
+def read_long_format(
+    path: str,
+    columns: Optional[List[str]] = None,
+    chunksize: int = defaults.INGEST_CHUNKSIZE,
+) -> Iterator[pandas.DataFrame]:
+    """
+    Lazily read a long format CSV or Parquet file in chunks of at most ``chunksize`` rows. Parquet files
+    require ``pyarrow``.
 
-    sum_mat, sum_mat_labels = to_sum_mat(
-        ntree=None, node_labels=[["total"], grouped_levels, bottom_levels]
+    Parameters
+    ----------
+    path : str
+        Path to the file, files ending in ``.parquet`` or ``.pq`` are read as Parquet, anything else as CSV
+    columns : List[str]
+        Columns to read, defaults to all of them
+    chunksize : int
+        Maximum number of rows per chunk
+
+    Returns
+    -------
+    Iterator[pandas.DataFrame]
+    """
+    if os.path.splitext(path)[1].lower() in [".parquet", ".pq"]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:  # pragma: no cover
+            logger.error(
+                "pyarrow must be installed to read parquet files. Install it with: pip install pyarrow"
+            )
+            raise
+        for batch in pq.ParquetFile(path).iter_batches(
+            batch_size=chunksize, columns=columns
+        ):
+            yield batch.to_pandas()
+    else:
+        yield from pandas.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+def stream_hierarchichal_df(
+    chunks: Iterable[pandas.DataFrame],
+    level_names: List[str],
+    hierarchy: List[List[str]],
+    date_colname: str,
+    val_colname: str,
+    freq: Optional[str] = None,
+) -> Tuple[pandas.DataFrame, np.array, List[str]]:
+    """
+    Streaming counterpart of :py:func:`get_hierarchichal_df`, for long format data that does not fit in memory.
+    Each chunk is reduced to per bottom level series and per time bucket sums as it arrives, and the partial sums
+    are merged every time they double in size, so memory is bounded by the size of the wide output rather than
+    by the number of input rows. Unlike :py:func:`get_hierarchichal_df`, repeated dates of the same series,
+    e.g. individual transactions, are summed.
+
+    Parameters
+    ----------
+    chunks : Iterable[pandas.DataFrame]
+        Long format chunks, e.g. from :py:func:`read_long_format`
+    level_names : List[str]
+        Levels in the hierarchy.
+    hierarchy : List[List[str]]
+        Desired levels in your hierarchy.
+    date_colname : str
+        Date column name
+    val_colname : str
+        Name of column containing series values.
+    freq : str
+        Optional pandas frequency the dates are bucketed to, e.g. ``"1D"``
+
+    Returns
+    -------
+    pd.DataFrame
+        Wide dataframe with levels of specified aggregation.
+
+    np.array
+        Summing matrix.
+
+    List[str]:
+        Summing matrix labels.
+
+    Examples
+    --------
+    >>> import hts.functions
+    >>> chunks = hts.functions.read_long_format('transactions.csv', chunksize=1_000_000)
+    >>> wide_df, sum_mat, sum_mat_labels = hts.functions.stream_hierarchichal_df(chunks,
+                                                                                 level_names=['lev1', 'lev2'],
+                                                                                 hierarchy=[['lev1'], ['lev2']],
+                                                                                 date_colname='ds',
+                                                                                 val_colname='val',
+                                                                                 freq='1D')
+    """
+    keys = [date_colname] + level_names
+    partials, pending, compacted = [], 0, 0
+    for chunk in chunks:
+        dates = chunk[date_colname]
+        if freq:
+            dates = pandas.to_datetime(dates).dt.to_period(freq).dt.start_time
+            dates = dates.rename(date_colname)
+        partial = (
+            chunk[val_colname]
+            .groupby([dates] + [chunk[level] for level in level_names], sort=False)
+            .sum()
+        )
+        partials.append(partial)
+        pending += len(partial)
+        if pending > 2 * compacted:
+            partials = [_merge_partials(partials, keys)]
+            pending = compacted = len(partials[0])
+
+    if not partials:
+        raise ValueError("No data to aggregate, `chunks` is empty")
+    long_df = _merge_partials(partials, keys).reset_index()
+    return get_hierarchichal_df(
+        long_df,
+        level_names=level_names,
+        hierarchy=hierarchy,
+        date_colname=date_colname,
+        val_colname=val_colname,
     )
 
-    forecast_df = add_agg_series_to_df(forecast_df, grouped_levels, bottom_levels)
 
-    return forecast_df, sum_mat, sum_mat_labels
+def _merge_partials(partials: List[pandas.Series], keys: List[str]) -> pandas.Series:
+    if len(partials) == 1:
+        return partials[0]
+    return pandas.concat(partials).groupby(level=keys, sort=False).sum()
@@ -1,11 +1,17 @@
+import logging
+import sys
 import weakref
 from collections import deque
 from itertools import chain
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 
+import numpy
 import pandas
+from scipy import sparse
 
 from hts._t import ExogT, NAryTreeT, NodesT
+from hts.core.exceptions import InvalidArgumentException, MissingRegressorException
+from hts.hierarchy.store import ColumnarStore, append_index, load_npz, save_npz
 from hts.hierarchy.utils import (
     fetch_cols,
     groupify,
@@ -15,6 +21,57 @@ from hts.hierarchy.utils import (
 )
 from hts.viz.geo import HierarchyVisualizer
 
+logger = logging.getLogger(__name__)
+
+
+class _TreeIndex(NamedTuple):
+    """
+    Traversals of a (sub)tree, computed with a single breadth first search and cached on its root
+    """
+
+    nodes: List[NAryTreeT]
+    keys: Dict[str, NAryTreeT]
+    children_counts: List[List[int]]
+    labels: List[List[str]]
+
+
+def _walk(nodes: NodesT, root_key: str) -> List[Tuple[Optional[int], str]]:
+    """
+    Breadth first walk of a nodes definition, yielding the position of the parent of each key in the walk
+    """
+    order = [(None, root_key)]
+    expanded = set()
+    queue = deque([0])
+    while queue:
+        position = queue.popleft()
+        key = order[position][1]
+        if key not in nodes:
+            continue
+        if key in expanded:
+            raise InvalidArgumentException(
+                f"Node {key} appears more than once in the hierarchy"
+            )
+        expanded.add(key)
+        for child in nodes[key]:
+            order.append((position, child))
+            queue.append(len(order) - 1)
+
+    orphans = [key for key in nodes if key not in expanded]
+    if orphans:
+        logger.warning(
+            f"Nodes {orphans} are not reachable from {root_key} and were ignored"
+        )
+    return order
+
+
+def _store_columns(keys: List[str], exogenous: ExogT) -> List[str]:
+    """
+    Columns of the store of a tree: each node directly followed by its exogenous variables, so that the frame
+    of a node is a view of the store. Variables shared by several nodes are only stored after the first one
+    """
+    columns = [col for key in keys for col in fetch_cols(exogenous, key)[0]]
+    return list(dict.fromkeys(columns))
+
 
 class HierarchyTree(NAryTreeT):
     """
@@ -22,6 +79,18 @@ class HierarchyTree(NAryTreeT):
     it's children.
     """
 
+    __slots__ = (
+        "key",
+        "_item",
+        "exogenous",
+        "children",
+        "_parent",
+        "_index",
+        "_store",
+        "_visualizer",
+        "__weakref__",
+    )
+
     @classmethod
     def from_geo_events(
         cls,
@@ -34,6 +103,7 @@ class HierarchyTree(NAryTreeT):
         min_count: Union[float, int] = 0.2,
         root_name: str = "total",
         fillna: bool = False,
+        n_jobs: int = 1,
     ):
         """
 
@@ -51,13 +121,15 @@ class HierarchyTree(NAryTreeT):
         min_count
         root_name
         fillna
+        n_jobs : int
+            Number of processes used to compute the H3 indices, see :py:func:`hts.hierarchy.utils.hexify`
 
         Returns
         -------
         HierarchyTree
         """
 
-        hexified = hexify(df, lat_col, lon_col, levels=levels)
+        hexified = hexify(df, lat_col, lon_col, levels=levels, n_jobs=n_jobs)
         total = resample_count(hexified, resample_freq, root_name)
         hierarchy = cls(key=root_name, item=total)
         grouped = groupify(
@@ -84,14 +156,16 @@ class HierarchyTree(NAryTreeT):
         df: pandas.DataFrame,
         exogenous: ExogT = None,
         root: Union[str, "HierarchyTree"] = "total",
-        top: "HierarchyTree" = None,
-        stack: List = None,
+        columnar: bool = False,
     ):
         """
         Standard method for creating a hierarchy from nodes and a dataframe containing as columns those nodes.
         The nodes are represented as a dictionary containing as keys the nodes, and as values list of edges.
         See the examples for usage. The total column must be named total and not something else.
 
+        The tree is built breadth first without recursion, after checking that all the nodes and exogenous
+        variables are columns of ``df``. Keys of ``nodes`` that are not reachable from the root are logged and ignored.
+
         Parameters
         ----------
         nodes : NodesT
@@ -101,17 +175,24 @@ class HierarchyTree(NAryTreeT):
         exogenous : ExogT
             The nodes representing the exogenous variables
         root : Union[str, HierarchyTree]
-            The name of the root node
-        top : HierarchyTree
-            Not to be used for initialisation, only in recursive calls
-        stack : list
-            Not to be used for initialisation, only in recursive calls
+            The name of the root node, or an existing node the hierarchy is attached to
+        columnar : bool
+            Keep the data of the whole hierarchy in a single :py:class:`~hts.hierarchy.store.ColumnarStore`
+            instead of one dataframe per node. Each node then reads its data as a zero-copy view of the store,
+            and ``to_pandas`` on the root is a view as well. All columns must be numeric.
 
         Returns
         -------
         hierarchy : HierarchyTree
             The hierarchy tree representation of your data
 
+        Raises
+        ------
+        InvalidArgumentException
+            If nodes are missing from ``df``, or a node appears more than once in the hierarchy
+        MissingRegressorException
+            If exogenous variables are missing from ``df``
+
         Examples
         --------
         In this example we will create a tree from some multivariate data
@@ -161,41 +242,156 @@ class HierarchyTree(NAryTreeT):
 
         """
 
-        if stack is None:
-            stack = []
-            cols, ex = fetch_cols(exogenous, root)
-            root = HierarchyTree(
-                key=root, item=df[cols], exogenous=ex
-            )  # root node is created
-            top = root  # it is stored in b variable
-        x = root.key  # root.val = 2 for the first time
-        if len(nodes[x]) > 0:  # check if there are children of the node exists or not
-            for i in range(len(nodes[x])):  # iterate through each child
-                key = nodes[x][i]
-                cols, ex = fetch_cols(exogenous, key)
-                y = HierarchyTree(
-                    key=key, item=df[cols], exogenous=ex
-                )  # create Node for every child
-                root.children.append(y)  # append the child_node to its parent_node
-                stack.append(y)  # store that child_node in stack
-                if (
-                    y.key not in nodes.keys()
-                ):  # if the child_node_val = 0 that is the parent = leaf
-                    stack.pop()  # pop the 0 value from the stack
-            if len(stack):
-                if len(stack) >= 2:  # bottom-to-top
-                    tmp_root = stack.pop(0)
-                else:
-                    tmp_root = stack.pop()
-                cls.from_nodes(
-                    nodes=nodes,
-                    df=df,
-                    exogenous=exogenous,
-                    root=tmp_root,
-                    top=top,
-                    stack=stack,
-                )  # pass tmp_root to the function as root
-        return top
+        if isinstance(root, str):
+            root_key = root
+        else:
+            root_key = root.key
+
+        # Walk the keys first, so nothing is built before the definition is validated
+        order = _walk(nodes, root_key)
+
+        columns = set(df.columns)
+        missing = {key for _, key in order if key not in columns}
+        if isinstance(root, HierarchyTree):
+            missing.discard(root_key)
+        if missing:
+            raise InvalidArgumentException(
+                f"Nodes {sorted(missing)} were not found in the columns of `df`"
+            )
+        missing = {
+            col
+            for _, key in order
+            for col in fetch_cols(exogenous, key)[1] or []
+            if col not in columns
+        }
+        if missing:
+            raise MissingRegressorException(
+                f"Exogenous variables {sorted(missing)} were not found in the columns of `df`"
+            )
+
+        store = None
+        if columnar:
+            keys = [key for _, key in order]
+            if isinstance(root, HierarchyTree):
+                keys = keys[1:]
+            store = ColumnarStore(df, _store_columns(keys, exogenous))
+
+        built = []
+        for parent_position, key in order:
+            if parent_position is None:
+                if isinstance(root, HierarchyTree):
+                    built.append(root)
+                    root._invalidate_index()
+                    continue
+                parent = None
+            else:
+                parent = built[parent_position]
+            cols, ex = fetch_cols(exogenous, key)
+            if store is None:
+                node = HierarchyTree(
+                    key=key, item=df[cols], exogenous=ex, parent=parent
+                )
+            else:
+                node = HierarchyTree(key=key, exogenous=ex, parent=parent, store=store)
+            if parent is not None:
+                parent.children.append(node)
+            built.append(node)
+        return built[0]
+
+    @classmethod
+    def from_bottom(
+        cls,
+        nodes: NodesT,
+        df: pandas.DataFrame,
+        exogenous: ExogT = None,
+        root: str = "total",
+        columnar: bool = False,
+    ):
+        """
+        Create a hierarchy from the series of the leaves only. The series of all the other nodes are computed
+        with a single product of the sparse summing matrix with the leaves, so the data of the tree is coherent
+        by construction. Columns of ``df`` named after other nodes are ignored.
+
+        Parameters
+        ----------
+        nodes : NodesT
+            Nodes definition, as for :py:meth:`from_nodes`
+        df : pandas.DataFrame
+            The series of the leaves, and the exogenous variables
+        exogenous : ExogT
+            The nodes representing the exogenous variables
+        root : str
+            The name of the root node
+        columnar : bool
+            Keep the data of the whole hierarchy in a single :py:class:`~hts.hierarchy.store.ColumnarStore`,
+            the aggregates are then computed directly into it
+
+        Returns
+        -------
+        hierarchy : HierarchyTree
+            The hierarchy tree representation of your data
+
+        Raises
+        ------
+        InvalidArgumentException
+            If leaves are missing from ``df``, or a node appears more than once in the hierarchy
+        MissingRegressorException
+            If exogenous variables are missing from ``df``
+        """
+        order = _walk(nodes, root)
+        keys = [key for _, key in order]
+        leaves = [i for i, key in enumerate(keys) if not nodes.get(key)]
+        missing = [keys[i] for i in leaves if keys[i] not in df.columns]
+        if missing:
+            raise InvalidArgumentException(
+                f"Leaves {sorted(missing)} were not found in the columns of `df`"
+            )
+
+        # The summing matrix has a row per node and a column per leaf, its entries
+        # are found by walking up from every leaf
+        parents = numpy.array(
+            [-1] + [position for position, _ in order[1:]], dtype=numpy.int64
+        )
+        rows = numpy.array(leaves, dtype=numpy.int64)
+        cols = numpy.arange(len(leaves))
+        all_rows, all_cols = [], []
+        while len(rows):
+            all_rows.append(rows)
+            all_cols.append(cols)
+            up = parents[rows]
+            rows, cols = up[up >= 0], cols[up >= 0]
+        sum_mat = sparse.csr_matrix(
+            (
+                numpy.ones(sum(map(len, all_rows))),
+                (numpy.concatenate(all_rows), numpy.concatenate(all_cols)),
+            ),
+            shape=(len(keys), len(leaves)),
+        )
+        # Transposed product, so the aggregates come out column major
+        values = (sum_mat @ df[[keys[i] for i in leaves]].to_numpy().T).T
+
+        columns = _store_columns(keys, exogenous)
+        regressors = [col for col in columns if col not in keys]
+        missing = [col for col in regressors if col not in df.columns]
+        if missing:
+            raise MissingRegressorException(
+                f"Exogenous variables {sorted(missing)} were not found in the columns of `df`"
+            )
+        if columns != keys:
+            positions = {col: i for i, col in enumerate(columns)}
+            full = numpy.empty(
+                (len(df), len(columns)),
+                dtype=numpy.result_type(values, *df[regressors].dtypes),
+                order="F",
+            )
+            full[:, [positions[key] for key in keys]] = values
+            for col in regressors:
+                full[:, positions[col]] = df[col].to_numpy()
+            values = full
+        frame = pandas.DataFrame(values, index=df.index, columns=columns, copy=False)
+        return cls.from_nodes(
+            nodes, frame, exogenous=exogenous, root=root, columnar=columnar
+        )
 
     def __init__(
         self,
@@ -204,9 +400,11 @@ class HierarchyTree(NAryTreeT):
         exogenous: List[str] = None,
         children: List[NAryTreeT] = None,
         parent: NAryTreeT = None,
+        store: Optional[ColumnarStore] = None,
     ):
 
-        self.key = key
+        self.key = sys.intern(key) if isinstance(key, str) else key
+        self._store = store
         self.item = item
         if exogenous:
             self.exogenous = exogenous
@@ -214,11 +412,77 @@ class HierarchyTree(NAryTreeT):
             self.exogenous = []
         self.children = children or []
         self._parent = weakref.ref(parent) if parent else None
-        self.visualizer = HierarchyVisualizer(self)
+        self._index = None
+        self._visualizer = None
+
+    @property
+    def item(self) -> Union[pandas.Series, pandas.DataFrame]:
+        if self._item is None and self._store is not None:
+            self._item = self._store.frame(self.key, self.exogenous)
+        return self._item
+
+    @item.setter
+    def item(self, value: Union[pandas.Series, pandas.DataFrame]) -> None:
+        self._item = value
+
+    @property
+    def visualizer(self) -> HierarchyVisualizer:
+        if self._visualizer is None:
+            self._visualizer = HierarchyVisualizer(self)
+        return self._visualizer
+
+    @visualizer.setter
+    def visualizer(self, value: HierarchyVisualizer) -> None:
+        self._visualizer = value
+
+    def _store_backed(self) -> bool:
+        return self._store is not None and (
+            self._item is None or self._store.is_view(self._item, self.key)
+        )
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_visualizer"] = None
+        # Views are rebuilt from the store on access
+        if self._store_backed():
+            state["_item"] = None
+        return state
+
+    def __setstate__(self, state):
+        self._item = self._store = self._visualizer = None
+        self.exogenous = []
+        super().__setstate__(state)
+
+    def _get_index(self) -> _TreeIndex:
+        if self._index is None:
+            nodes, children_counts, labels = [], [], []
+            level = [self]
+            while level:
+                nodes.extend(level)
+                children_counts.append([len(n.children) for n in level])
+                labels.append([n.key for n in level])
+                level = [child for n in level for child in n.children]
+            keys = {}
+            for node in nodes:
+                keys.setdefault(node.key, node)
+            self._index = _TreeIndex(
+                nodes=nodes,
+                keys=keys,
+                children_counts=children_counts[:-1],
+                labels=labels,
+            )
+        return self._index
+
+    def _invalidate_index(self) -> None:
+        node = self
+        while node is not None:
+            node._index = None
+            node = node.parent
 
     def get_node(self, key: str) -> Optional[NAryTreeT]:
         """
-        Get a node given its key
+        Get a node given its key. Lookups go through a key to node index that is built once and
+        invalidated by :py:meth:`add_child`
 
         Parameters
         ----------
@@ -230,10 +494,7 @@ class HierarchyTree(NAryTreeT):
             The node of interest
 
         """
-        for node in self.traversal_level():
-            if node.key == key:
-                return node
-        return None
+        return self._get_index().keys.get(key)
 
     def traversal_level(self) -> List[NAryTreeT]:
         """
@@ -244,16 +505,7 @@ class HierarchyTree(NAryTreeT):
         list of nodes
         """
 
-        res = []
-        q = deque([(self, 0)])
-        while q:
-            n, li = q.popleft()
-            if len(res) < li + 1:
-                res.append([])
-            for i in n.children:
-                q.append((i, li + 1))
-            res[li].extend(n.children)
-        return list(chain.from_iterable(res[:-1]))
+        return self._get_index().nodes[1:]
 
     def num_nodes(self) -> int:
         """
@@ -290,10 +542,10 @@ class HierarchyTree(NAryTreeT):
         return len(self.level_order_traversal())
 
     def get_node_height(self, key: str) -> int:
-        for node in self.traversal_level():
-            if node.key == key:
-                return node.get_height()
-        return -1
+        node = self.get_node(key)
+        if node is None:
+            return -1
+        return node.get_height()
 
     def level_order_traversal(self: NAryTreeT) -> List[List[int]]:
         """
@@ -305,16 +557,7 @@ class HierarchyTree(NAryTreeT):
         list[list[int]]
         """
 
-        res = []
-        q = deque([(self, 0)])
-        while q:
-            n, li = q.popleft()
-            if len(res) < li + 1:
-                res.append([])
-            for i in n.children:
-                q.append((i, li + 1))
-            res[li].append(len(n.children))
-        return res[:-1]
+        return [list(counts) for counts in self._get_index().children_counts]
 
     def get_level_order_labels(self: NAryTreeT) -> List[List[str]]:
         """
@@ -330,20 +573,12 @@ class HierarchyTree(NAryTreeT):
         List[List[str]]
             Node labels corresponding to level order traversal.
         """
-        labels = []
-        q = deque([(self, 0)])
-        while q:
-            n, li = q.popleft()
-            if len(labels) < li + 1:
-                labels.append([])
-            for i in n.children:
-                q.append((i, li + 1))
-            labels[li].append(n.key)
-        return labels
+        return [list(labels) for labels in self._get_index().labels]
 
     def add_child(self, key=None, item=None, exogenous=None) -> NAryTreeT:
         child = HierarchyTree(key=key, item=item, exogenous=exogenous, parent=self)
         self.children.append(child)
+        self._invalidate_index()
         return child
 
     def leaf_sum(self) -> int:
@@ -357,11 +592,160 @@ class HierarchyTree(NAryTreeT):
         df : pandas.DataFrame
             Dataframe representation of the tree
         """
-        df = pandas.concat(
-            [self.item] + [c.item[c.key] for c in self.traversal_level()], 1
-        )
+        nodes = self.traversal_level()
+        if self._store is not None and self._store.layout is None:
+            if all(
+                c._store is self._store and c._store_backed() for c in [self] + nodes
+            ):
+                return self._store.to_pandas(
+                    [self.key] + self.exogenous + [c.key for c in nodes]
+                )
+        df = pandas.concat([self.item] + [c.item[c.key] for c in nodes], 1)
         df.index.name = "ds"
         return df
 
     def get_series(self) -> pandas.Series:
         return self.item[self.key]
+
+    def detached(self) -> "HierarchyTree":
+        """
+        Copy of the node holding only its key, data and exogenous variables, without parent, children or store.
+        The data is shared, not copied. This is what models need, and it is cheap to send to worker processes:
+        pickling a node otherwise pickles its whole subtree, or the whole store of a columnar tree
+
+        Returns
+        -------
+        HierarchyTree
+        """
+        return HierarchyTree(
+            key=self.key, item=self.item, exogenous=list(self.exogenous)
+        )
+
+    def append(self, df: pandas.DataFrame) -> None:
+        """
+        Extend the series of every node with new rows, e.g. when a new day of data arrives, instead of rebuilding
+        the tree from the whole history with :py:meth:`from_nodes`.
+
+        ``df`` holds a column per node and per exogenous variable, like the dataframe given to :py:meth:`from_nodes`.
+        When it only holds the leaves, the other nodes are computed by summing them. Nodes of a tree built with
+        ``columnar=True`` get the new rows in the spare capacity of the store, whose history is only copied
+        when it grows, at amortized constant cost per row, see :py:meth:`~hts.hierarchy.store.ColumnarStore.append`.
+        Nodes holding their own dataframe are concatenated, which copies their whole history on every call.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The new rows, indexed after the last row of every node
+
+        Raises
+        ------
+        InvalidArgumentException
+            If not called on the root, if leaves are missing from ``df`` or if its rows do not follow the existing ones
+        MissingRegressorException
+            If exogenous variables are missing from ``df``
+        """
+        if self.parent is not None:
+            raise InvalidArgumentException(
+                "Data can only be appended to the root of a hierarchy"
+            )
+        nodes = make_iterable(self, prop=None)
+        for node in nodes:
+            if not isinstance(node.item, pandas.DataFrame):
+                raise InvalidArgumentException(
+                    f"Node {node.key} must hold a dataframe to be extended"
+                )
+        missing = [node for node in nodes if node.key not in df.columns]
+        leaves = [node.key for node in missing if node.is_leaf()]
+        if leaves:
+            raise InvalidArgumentException(
+                f"Leaves {leaves} were not found in the columns of `df`"
+            )
+        exogenous = {col for node in nodes for col in node.exogenous} - set(df.columns)
+        if exogenous:
+            raise MissingRegressorException(
+                f"Exogenous variables {sorted(exogenous)} were not found in the columns of `df`"
+            )
+        if not (df.index.is_monotonic_increasing and df.index.is_unique):
+            raise InvalidArgumentException("The index of `df` must be increasing")
+
+        if missing:
+            from hts.functions import to_sparse_sum_mat
+
+            # Rows of the summing matrix follow the nodes, columns the leaves
+            sum_mat, _ = to_sparse_sum_mat(self)
+            bottom = [node.key for node in nodes if node.is_leaf()]
+            totals = sum_mat @ df[bottom].to_numpy().T
+            positions = {id(node): i for i, node in enumerate(nodes)}
+            aggregates = pandas.DataFrame(
+                {node.key: totals[positions[id(node)]] for node in missing},
+                index=df.index,
+            )
+            df = pandas.concat([df, aggregates], axis=1)
+
+        backed = [node._store_backed() and node._store.layout is None for node in nodes]
+        stores = {id(n._store): n._store for n, b in zip(nodes, backed) if b}
+        indices = [store.index for store in stores.values()] + [
+            n.item.index for n, b in zip(nodes, backed) if not b
+        ]
+        if len(df) and any(len(i) and df.index[0] <= i[-1] for i in indices):
+            raise InvalidArgumentException(
+                "The rows of `df` must follow the existing rows of the hierarchy"
+            )
+
+        for store in stores.values():
+            store.append(df[store.columns].to_numpy(), df.index)
+        for node, store_backed in zip(nodes, backed):
+            if store_backed:
+                # Rebuilt from the extended store on access
+                node._item = None
+                continue
+            item = pandas.concat([node.item, df[node.item.columns]])
+            item.index = append_index(node.item.index, df.index)
+            node.item = item
+
+    def save(self, path: str) -> None:
+        """
+        Write the tree to a single uncompressed ``npz`` file: the keys, parents and exogenous variables of the
+        nodes as flat arrays, and the data of all the nodes as one column major value matrix that
+        :py:meth:`load` can memory-map. Columns shared by several nodes (e.g. the same exogenous variable) are
+        written once, nodes covering only part of the tree's index are padded with zeros.
+
+        Parameters
+        ----------
+        path : str
+            Destination file, written as is, no ``.npz`` suffix is appended
+        """
+        nodes = make_iterable(self, prop=None)
+        positions = {id(node): i for i, node in enumerate(nodes)}
+        parents = numpy.array(
+            [-1] + [positions[id(node.parent)] for node in nodes[1:]], dtype=numpy.int64
+        )
+        save_npz(path, nodes, parents)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "c") -> "HierarchyTree":
+        """
+        Read a tree written by :py:meth:`save`. The nodes are backed by a columnar store over the value
+        matrix, so their data is only materialized on access, as views of the file when it is memory-mapped.
+
+        Parameters
+        ----------
+        path : str
+            File written by :py:meth:`save`
+        mmap_mode : str
+            Mode passed to ``numpy.memmap``, the default ``"c"`` (copy-on-write) never modifies the file.
+            ``None`` reads the values into memory
+
+        Returns
+        -------
+        HierarchyTree
+        """
+        store, keys, parents, exogenous = load_npz(path, mmap_mode=mmap_mode)
+        built = []
+        for key, parent_position, ex in zip(keys, parents.tolist(), exogenous):
+            parent = built[parent_position] if parent_position >= 0 else None
+            node = cls(key=key, exogenous=ex, parent=parent, store=store)
+            if parent is not None:
+                parent.children.append(node)
+            built.append(node)
+        return built[0]
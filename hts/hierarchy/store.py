@@ -0,0 +1,424 @@
+import struct
+import zipfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy
+import pandas
+
+from hts._t import NAryTreeT
+from hts.core.exceptions import InvalidArgumentException
+
+# Rows and columns of the store holding the data of a node, and their names
+Layout = Dict[str, Tuple[int, int, List[int], List[str]]]
+
+
+class ColumnarStore(object):
+    """
+    Column major 2-D array holding the data of a whole hierarchy, with a single index shared by all the nodes.
+    Nodes of a tree built with ``columnar=True`` read their data as zero-copy views of this array.
+
+    ``values`` is a view of the first rows of a larger buffer, so that :py:meth:`append` can add rows in place
+    and only reallocates, doubling the capacity, when the buffer is full. A new store has no spare capacity, so
+    that trees which are never extended do not pay for it: the first append copies the existing rows once.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The data, all columns must share a numeric dtype
+    columns : List[str]
+        Columns of ``df`` to store, in order
+    """
+
+    def __init__(self, df: pandas.DataFrame, columns: List[str]):
+        # No copy when the frame already holds a single block of the columns in order
+        frame = df if list(df.columns) == list(columns) else df[columns]
+        values = frame.to_numpy()
+        if not numpy.issubdtype(values.dtype, numpy.number):
+            raise InvalidArgumentException(
+                "A columnar store can only hold numeric columns"
+            )
+        self.values: numpy.ndarray = numpy.asfortranarray(values)
+        self._buffer: numpy.ndarray = self.values
+        self.index: pandas.Index = df.index
+        self.columns: List[str] = list(columns)
+        self.positions: Dict[str, int] = {col: i for i, col in enumerate(columns)}
+        self.layout: Optional[Layout] = None
+
+    @classmethod
+    def from_arrays(
+        cls,
+        values: numpy.ndarray,
+        index: pandas.Index,
+        columns: List[str],
+        layout: Optional[Layout] = None,
+    ) -> "ColumnarStore":
+        """
+        Store wrapping existing arrays, e.g. memory-mapped from a file written by :py:func:`save_npz`
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Column major array of shape ``(len(index), len(columns))``
+        index : pandas.Index
+            Index shared by all the columns
+        columns : List[str]
+            Name of each column
+        layout : Layout
+            Rows and columns of each node, only needed when nodes do not span the whole index or hold other columns
+            than their series and exogenous variables
+
+        Returns
+        -------
+        ColumnarStore
+        """
+        store = cls.__new__(cls)
+        store.values = store._buffer = values
+        store.index = index
+        store.columns = list(columns)
+        store.positions = {}
+        for i, col in enumerate(store.columns):
+            store.positions.setdefault(col, i)
+        store.layout = layout
+        return store
+
+    def __getstate__(self):
+        # Spare capacity is not pickled
+        state = dict(self.__dict__)
+        state["_buffer"] = self.values
+        return state
+
+    def append(self, values: numpy.ndarray, index: pandas.Index) -> None:
+        """
+        Add rows after the existing ones. Rows are written in the spare capacity of the buffer, the existing
+        rows are only copied when it is full, into a buffer of twice the size, so over a sequence of appends
+        each row is copied a constant number of times on average. The first append to a new store always
+        copies, as it has no spare capacity yet. Frames previously returned by :py:meth:`frame` keep referring
+        to the old rows.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Array of shape ``(len(index), len(columns))``
+        index : pandas.Index
+            Index of the new rows
+        """
+        if self.layout is not None:
+            raise InvalidArgumentException(
+                "Rows cannot be appended to a store whose nodes span different ranges"
+            )
+        values = numpy.asarray(values)
+        if values.shape != (len(index), len(self.columns)):
+            raise InvalidArgumentException(
+                f"Expected values of shape {(len(index), len(self.columns))}, got {values.shape}"
+            )
+        n_rows = len(self.values)
+        dtype = numpy.result_type(self._buffer.dtype, values.dtype)
+        if n_rows + len(index) > len(self._buffer) or dtype != self._buffer.dtype:
+            capacity = max(n_rows + len(index), 2 * len(self._buffer))
+            buffer = numpy.empty((capacity, len(self.columns)), dtype=dtype, order="F")
+            buffer[:n_rows] = self.values
+            self._buffer = buffer
+        self._buffer[n_rows : n_rows + len(index)] = values
+        self.values = self._buffer[: n_rows + len(index)]
+        self.index = append_index(self.index, index)
+
+    def _view(self, start: int, stop: int) -> pandas.DataFrame:
+        return pandas.DataFrame(
+            self.values[:, start:stop],
+            index=self.index,
+            columns=self.columns[start:stop],
+            copy=False,
+        )
+
+    def frame(
+        self, key: str, exogenous: Optional[List[str]] = None
+    ) -> pandas.DataFrame:
+        """
+        Data of a node. The series of the node is a view of the store, exogenous variables are also views when
+        they directly follow it in the store, otherwise they are copied in.
+
+        Parameters
+        ----------
+        key : str
+            The key of the node
+        exogenous : List[str]
+            Exogenous variables of the node
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        if self.layout is not None:
+            start, stop, cols, names = self.layout[key]
+            if cols == list(range(cols[0], cols[0] + len(cols))):
+                values = self.values[start:stop, cols[0] : cols[0] + len(cols)]
+            else:
+                values = self.values[start:stop][:, cols]
+            return pandas.DataFrame(
+                values, index=self.index[start:stop], columns=names, copy=False
+            )
+
+        start = self.positions[key]
+        cols = [key] + (exogenous or [])
+        if self.columns[start : start + len(cols)] == cols:
+            return self._view(start, start + len(cols))
+        return pandas.DataFrame(
+            self.values[:, [self.positions[col] for col in cols]],
+            index=self.index,
+            columns=cols,
+        )
+
+    def is_view(self, frame: pandas.DataFrame, key: str) -> bool:
+        """
+        Whether the column ``key`` of ``frame`` still is a view of the store
+        """
+        return numpy.shares_memory(frame[key].values, self.values)
+
+    def to_pandas(self, columns: List[str]) -> pandas.DataFrame:
+        """
+        Frame of the given columns of the store, a zero-copy view when they are its first columns, in order
+        """
+        if self.columns[: len(columns)] == columns:
+            values = self.values[:, : len(columns)]
+        else:
+            values = self.values[:, [self.positions[col] for col in columns]]
+        return pandas.DataFrame(
+            values, index=self.index.rename("ds"), columns=columns, copy=False
+        )
+
+
+def append_index(index: pandas.Index, other: pandas.Index) -> pandas.Index:
+    """
+    Concatenate two indices, keeping the frequency of a datetime index when ``other`` continues it
+    """
+    appended = index.append(other)
+    freq = getattr(index, "freq", None)
+    if freq is not None and len(index) and len(other) and other[0] == index[-1] + freq:
+        try:
+            appended = pandas.DatetimeIndex(appended, freq=freq)
+        except ValueError:
+            pass
+    return appended
+
+
+def _common_index(indices: Sequence[pandas.Index]) -> pandas.Index:
+    index = indices[0]
+    if all(i is index or i.equals(index) for i in indices[1:]):
+        return index
+    union = index.append(list(indices[1:])).unique().sort_values()
+    if isinstance(union, pandas.DatetimeIndex) and len(union) > 2:
+        union = pandas.DatetimeIndex(union, freq="infer")
+    return union
+
+
+def _encode_index(index: pandas.Index) -> Dict[str, numpy.ndarray]:
+    arrays = {
+        "index_name": numpy.array([] if index.name is None else [str(index.name)])
+    }
+    if isinstance(index, pandas.DatetimeIndex):
+        arrays["index"] = index.asi8
+        arrays["index_tz"] = numpy.array([] if index.tz is None else [str(index.tz)])
+        arrays["index_freq"] = numpy.array(
+            [] if index.freq is None else [index.freqstr]
+        )
+        return arrays
+    values = numpy.asarray(index)
+    if values.dtype == object:
+        if pandas.api.types.infer_dtype(values) != "string":
+            raise InvalidArgumentException(
+                "Only datetime, numeric and string indices can be saved"
+            )
+        values = values.astype(str)
+    arrays["index"] = values
+    return arrays
+
+
+def _decode_index(arrays: Dict[str, numpy.ndarray]) -> pandas.Index:
+    name = arrays["index_name"][0] if len(arrays["index_name"]) else None
+    if "index_tz" not in arrays:
+        return pandas.Index(arrays["index"], name=name)
+    index = pandas.DatetimeIndex(arrays["index"].view("datetime64[ns]"), name=name)
+    if len(arrays["index_tz"]):
+        index = index.tz_localize("UTC").tz_convert(arrays["index_tz"][0])
+    if len(arrays["index_freq"]):
+        index.freq = arrays["index_freq"][0]
+    return index
+
+
+def _flatten(lists: List[List]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    offsets = numpy.zeros(len(lists) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(values) for values in lists])
+    return numpy.array([value for values in lists for value in values]), offsets
+
+
+def _unflatten(flat: numpy.ndarray, offsets: numpy.ndarray) -> List[List]:
+    flat = flat.tolist()
+    return [flat[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+
+
+def save_npz(path: str, nodes: List[NAryTreeT], parents: numpy.ndarray) -> None:
+    """
+    Write the structure and the data of a tree to an uncompressed ``npz`` file, see
+    :py:meth:`hts.hierarchy.HierarchyTree.save`
+
+    Parameters
+    ----------
+    path : str
+        Destination file
+    nodes : List[NAryTreeT]
+        The nodes, in level order
+    parents : numpy.ndarray
+        Position of the parent of each node, ``-1`` for the root
+    """
+    frames = []
+    for node in nodes:
+        item = node.item
+        if not isinstance(item, pandas.DataFrame) or node.key not in item.columns:
+            raise InvalidArgumentException(
+                f"Node {node.key} must hold a dataframe with a {node.key} column"
+            )
+        frames.append(item)
+    keys = numpy.array([node.key for node in nodes])
+    if keys.dtype.kind not in "iuU":
+        raise InvalidArgumentException("Only string or integer keys can be saved")
+
+    index = _common_index([frame.index for frame in frames])
+    spans = numpy.empty((len(frames), 2), dtype=numpy.int64)
+    for i, frame in enumerate(frames):
+        if frame.index is index or frame.index.equals(index):
+            spans[i] = 0, len(index)
+            continue
+        rows = index.get_indexer(frame.index)
+        start = rows[0] if len(rows) else 0
+        if not numpy.array_equal(rows, numpy.arange(start, start + len(rows))):
+            raise InvalidArgumentException(
+                f"The index of node {nodes[i].key} is not a range of the tree's index"
+            )
+        spans[i] = start, start + len(rows)
+
+    # Series of each node, in level order, directly followed by its other columns,
+    # which are shared between nodes when identical
+    sources: List[Tuple[int, str]] = []
+    shared: Dict[str, List[int]] = {}
+
+    def add(position: int, name: str, share: bool) -> int:
+        data = frames[position][name].values
+        for col in shared.get(name, []) if share else []:
+            other, other_name = sources[col]
+            if numpy.array_equal(spans[other], spans[position]) and numpy.array_equal(
+                frames[other][other_name].values, data
+            ):
+                return col
+        sources.append((position, name))
+        shared.setdefault(name, []).append(len(sources) - 1)
+        return len(sources) - 1
+
+    def others(position: int) -> List[str]:
+        return [col for col in frames[position].columns if col != nodes[position].key]
+
+    node_cols = [
+        [add(i, node.key, False)] + [add(i, col, True) for col in others(i)]
+        for i, node in enumerate(nodes)
+    ]
+
+    dtype = numpy.result_type(*[dt for frame in frames for dt in frame.dtypes])
+    if not numpy.issubdtype(dtype, numpy.number) and dtype != bool:
+        raise InvalidArgumentException("Only numeric data can be saved")
+    values = numpy.zeros((len(index), len(sources)), dtype=dtype, order="F")
+    for col, (position, name) in enumerate(sources):
+        start, stop = spans[position]
+        values[start:stop, col] = frames[position][name].values
+
+    node_columns, column_offsets = _flatten(node_cols)
+    node_names, _ = _flatten([[nodes[i].key] + others(i) for i in range(len(nodes))])
+    exogenous, exogenous_offsets = _flatten([node.exogenous for node in nodes])
+    with open(path, "wb") as f:
+        numpy.savez(
+            f,
+            values=values,
+            columns=numpy.array([name for _, name in sources]),
+            keys=keys,
+            parents=numpy.asarray(parents, dtype=numpy.int64),
+            spans=spans,
+            node_columns=node_columns.astype(numpy.int64),
+            node_names=node_names,
+            column_offsets=column_offsets,
+            exogenous=exogenous.astype(str),
+            exogenous_offsets=exogenous_offsets,
+            **_encode_index(index),
+        )
+
+
+def _memmap_member(path: str, name: str, mode: str) -> numpy.ndarray:
+    """
+    Memory-map an array stored uncompressed in an ``npz`` file
+    """
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise InvalidArgumentException(f"{name} is compressed and cannot be mapped")
+
+    with open(path, "rb") as f:
+        # Skip the local file header, its extra field can differ from the
+        # central directory's
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = struct.unpack("<HH", f.read(4))
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = numpy.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    order = "F" if fortran_order else "C"
+    if not numpy.prod(shape):
+        return numpy.zeros(shape, dtype=dtype, order=order)
+    return numpy.memmap(
+        path, dtype=dtype, mode=mode, offset=offset, shape=shape, order=order
+    )
+
+
+def load_npz(
+    path: str, mmap_mode: Optional[str] = "c"
+) -> Tuple[ColumnarStore, List, numpy.ndarray, List[List[str]]]:
+    """
+    Read a file written by :py:func:`save_npz`, see :py:meth:`hts.hierarchy.HierarchyTree.load`
+
+    Returns
+    -------
+    Tuple[ColumnarStore, List, numpy.ndarray, List[List[str]]]
+        The store holding the data, and the key, parent position and exogenous variables of each node
+    """
+    with numpy.load(path, allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files if name != "values"}
+        if mmap_mode:
+            values = _memmap_member(path, "values", mmap_mode)
+        else:
+            values = npz["values"]
+
+    keys = arrays["keys"].tolist()
+    node_columns = _unflatten(arrays["node_columns"], arrays["column_offsets"])
+    node_names = _unflatten(arrays["node_names"], arrays["column_offsets"])
+    exogenous = _unflatten(arrays["exogenous"], arrays["exogenous_offsets"])
+    columns = arrays["columns"].tolist()
+    index = _decode_index(arrays)
+
+    # Nodes can be looked up by column names when they span the whole index and
+    # only hold their series and exogenous variables
+    spans = arrays["spans"]
+    by_name = (
+        len(set(columns)) == len(columns)
+        and bool(numpy.all(spans[:, 0] == 0))
+        and bool(numpy.all(spans[:, 1] == len(index)))
+        and all(
+            names == [key] + ex for key, names, ex in zip(keys, node_names, exogenous)
+        )
+    )
+    layout = None
+    if not by_name:
+        layout = {
+            key: (int(span[0]), int(span[1]), cols, names)
+            for key, span, cols, names in zip(keys, spans, node_columns, node_names)
+        }
+    store = ColumnarStore.from_arrays(values, index, columns, layout=layout)
+    return store, keys, arrays["parents"], exogenous
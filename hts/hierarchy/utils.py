@@ -1,6 +1,8 @@
 import logging
-from typing import List, Optional, Tuple
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
 
+import numpy
 import pandas
 
 from hts._t import NAryTreeT
@@ -27,7 +29,39 @@ def fetch_cols(exogenous, name) -> Tuple[List[str], Optional[List[str]]]:
     return cols, exog
 
 
-def hexify(df, lat_col, lon_col, levels=(6, 8)) -> Optional[pandas.DataFrame]:
+def _geo_to_h3(points: Tuple[numpy.ndarray, numpy.ndarray, int]) -> List[str]:
+    from h3 import h3
+
+    lats, lons, resolution = points
+    return [h3.geo_to_h3(lat, lon, resolution) for lat, lon in zip(lats, lons)]
+
+
+def hexify(
+    df, lat_col, lon_col, levels=(6, 8), n_jobs: int = 1
+) -> Optional[pandas.DataFrame]:
+    """
+    Add to ``df`` one ``hex_index_{r}`` column of H3 cells for each resolution ``r`` in ``levels``. Each distinct
+    coordinate is only indexed once, at the finest resolution, and coarser cells are the parents of the finest ones,
+    so the cells of consecutive resolutions are always nested. Note that this can differ from indexing a point near
+    the border of a coarse cell at that resolution directly, as H3 cells are not exactly nested geometrically.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    lat_col : str
+        Column where the latitude coordinates can be found
+    lon_col : str
+        Column where the longitude coordinates can be found
+    levels : Tuple[int, int]
+        Coarsest and finest resolutions
+    n_jobs : int
+        Number of processes the distinct coordinates are indexed with
+
+    Returns
+    -------
+    pandas.DataFrame
+        ``df``, with the added columns
+    """
     try:
         from h3 import h3
     except ImportError:  # pragma: no cover
@@ -36,10 +70,39 @@ def hexify(df, lat_col, lon_col, levels=(6, 8)) -> Optional[pandas.DataFrame]:
             "Install it with: pip install scikit-hts[geo]"
         )
         return
-    for r in range(levels[0], levels[1] + 1):
-        df[f"hex_index_{r}"] = df.apply(
-            lambda x: h3.geo_to_h3(x[lat_col], x[lon_col], r), 1
-        )
+    # Rows without valid coordinates are indexed as '0' at every resolution
+    coords = df[[lat_col, lon_col]]
+    valid = numpy.isfinite(coords.values.astype(float)).all(axis=1)
+    coords = coords[valid]
+    codes = coords.groupby([lat_col, lon_col], sort=False).ngroup().values
+    _, first = numpy.unique(codes, return_index=True)
+    lats = coords[lat_col].values[first]
+    lons = coords[lon_col].values[first]
+
+    finest = levels[1]
+    if n_jobs > 1 and len(first) > n_jobs:
+        chunks = [
+            (lat, lon, finest)
+            for lat, lon in zip(
+                numpy.array_split(lats, n_jobs), numpy.array_split(lons, n_jobs)
+            )
+        ]
+        with Pool(n_jobs) as pool:
+            cells = [cell for chunk in pool.map(_geo_to_h3, chunks) for cell in chunk]
+    else:
+        cells = _geo_to_h3((lats, lons, finest))
+
+    cell_codes, cells = pandas.factorize(numpy.asarray(cells, dtype=object))
+    is_cell = numpy.array([h3.h3_is_valid(cell) for cell in cells], dtype=bool)
+    for r in range(levels[0], finest + 1):
+        resolved = numpy.full(len(cells), "0", dtype=object)
+        if r == finest:
+            resolved[is_cell] = cells[is_cell]
+        else:
+            resolved[is_cell] = [h3.h3_to_parent(cell, r) for cell in cells[is_cell]]
+        column = numpy.full(len(df), "0", dtype=object)
+        column[valid] = resolved[cell_codes][codes]
+        df[f"hex_index_{r}"] = column
     return df
 
 
@@ -73,36 +136,67 @@ def groupify(
 
     """
 
+    if len(nodes) > 1:
+        if isinstance(min_count, float):
+            allowance = len(total) * min_count
+        elif isinstance(min_count, int):
+            allowance = min_count
+        else:
+            raise InvalidArgumentException("min_count must be either float or integer")
+
+    # Parents are resolved by key rather than by scanning the tree. When keys are repeated
+    # the first node in level order wins, nodes are added level by level so setdefault keeps it
+    by_key = {node.key: node for node in reversed(root_node.traversal_level())}
+
     child_group = nodes[0]  # city
-    children = df[child_group].unique()  # berlin, munich, ...
+    counts = _resample_counts(df, child_group, freq)
 
     # add first level children
-    for child in children:
-        sub_df = df[df[child_group] == child]
-        resampled = resample_count(sub_df, freq, child)
-        root_node.add_child(key=child, item=resampled, exogenous=None)
+    for child in df[child_group].dropna().unique():  # berlin, munich, ...
+        added = root_node.add_child(key=child, item=counts[child], exogenous=None)
+        by_key.setdefault(child, added)
 
     # add the rest
     for node in nodes[1:]:
         parent_group = child_group
         child_group = node  # hex_index_6
-        children = df[child_group].unique()  # abcccc, abccf, ...
-
-        for child in children:
-            sub_df = df[df[child_group] == child]
-            if isinstance(min_count, float):
-                allowance = len(total) * min_count
-            elif isinstance(min_count, int):
-                allowance = min_count
-            else:
-                raise InvalidArgumentException(
-                    "min_count must be either float or integer"
-                )
-            if len(sub_df) < allowance:
+        sizes = df.groupby(child_group, sort=False).size()
+        kept = sizes[sizes >= allowance].index
+        if not len(kept):
+            continue
+        subset = df[df[child_group].isin(kept)]
+        counts = _resample_counts(subset, child_group, freq)
+        # Most frequent parent of each child, ties going to the first seen
+        parents = (
+            subset.groupby([child_group, parent_group], sort=False)
+            .size()
+            .groupby(level=0, sort=False)
+            .idxmax()
+        )
+
+        for child in subset[child_group].unique():  # abcccc, abccf, ...
+            parent = by_key.get(parents[child][1])
+            if parent is None:
                 continue
-            parent_name = sub_df[parent_group].value_counts().index[0]
-            resampled = resample_count(sub_df, freq, child)
-            for c in root_node.traversal_level():
-                if c.key == parent_name:
-                    c.add_child(key=child, item=resampled, exogenous=None)
+            added = parent.add_child(key=child, item=counts[child], exogenous=None)
+            by_key.setdefault(child, added)
     return root_node
+
+
+def _resample_counts(
+    df: pandas.DataFrame, group: str, freq: str
+) -> Dict[str, pandas.DataFrame]:
+    """
+    Same as :py:func:`resample_count` for each value of ``group``, with a single groupby over ``df``
+    """
+    sizes = df.groupby([df[group], pandas.Grouper(freq=freq)], sort=False).size()
+    counts = {}
+    for key, series in sizes.groupby(level=0, sort=False):
+        series = series.droplevel(0).sort_index()
+        series = series.reindex(
+            pandas.date_range(series.index[0], series.index[-1], freq=freq),
+            fill_value=0,
+        )
+        series.index.name = df.index.name
+        counts[key] = series.to_frame(key)
+    return counts
@@ -1,12 +1,14 @@
 from hts._t import ModelT
-from hts.model.ar import AutoArimaModel, SarimaxModel
-from hts.model.es import HoltWintersModel
+from hts.model.ar import AutoArimaModel, BatchedARModel, SarimaxModel
+from hts.model.es import BatchedHoltWintersModel, HoltWintersModel
 from hts.model.p import FBProphetModel
 
 __all__ = [
     "AutoArimaModel",
     "SarimaxModel",
+    "BatchedARModel",
     "HoltWintersModel",
+    "BatchedHoltWintersModel",
     "FBProphetModel",
     "MODEL_MAPPING",
 ]
@@ -15,6 +17,8 @@ __all__ = [
 MODEL_MAPPING = {
     ModelT.auto_arima.name: AutoArimaModel,
     ModelT.holt_winters.name: HoltWintersModel,
+    ModelT.holt_winters_batched.name: BatchedHoltWintersModel,
     ModelT.prophet.name: FBProphetModel,
     ModelT.sarimax.name: SarimaxModel,
+    ModelT.ar_batched.name: BatchedARModel,
 }
@@ -1,12 +1,19 @@
 import logging
 import warnings
+from typing import Dict, List, NamedTuple, Optional
 
+import numpy
 import pandas
+from numpy.lib.stride_tricks import as_strided
 from statsmodels.tools.sm_exceptions import ConvergenceWarning
 
+from hts import defaults
 from hts._t import ModelT
+from hts.core.exceptions import InvalidArgumentException, MissingRegressorException
 from hts.hierarchy import HierarchyTree
-from hts.model.base import TimeSeriesModel
+from hts.model.base import BatchedTimeSeriesModel, TimeSeriesModel
+
+logger = logging.getLogger(__name__)
 
 
 class AutoArimaModel(TimeSeriesModel):
@@ -35,11 +42,50 @@ class AutoArimaModel(TimeSeriesModel):
     predict(self, node, steps_ahead: int = 10, alpha: float = 0.05)
         Predicts the n-step ahead forecast. Exogenous variables are required if models were
         fit using them
+
+    When warm started, the order selected by the previous fit is refit as a ``pmdarima.ARIMA`` instead of
+    searching again, unless ``search_every`` fits were made since the last search or the in-sample MSE grew
+    by more than ``search_tolerance`` relative to the previous fit.
     """
 
-    def __init__(self, node: HierarchyTree, **kwargs):
+    def __init__(
+        self,
+        node: HierarchyTree,
+        search_every: int = defaults.SEARCH_EVERY,
+        search_tolerance: float = defaults.SEARCH_TOLERANCE,
+        **kwargs,
+    ):
+        self.search_every = search_every
+        self.search_tolerance = search_tolerance
+        # Fits since the last order search
+        self.refits = 0
         super().__init__(ModelT.auto_arima.name, node, **kwargs)
 
+    def _arima(self):
+        return getattr(self.model, "model_", self.model)
+
+    def _fit_pinned(self, y, X, **fit_args) -> bool:
+        """
+        Refit the order of the previous fit, keeping it unless the fit degraded
+        """
+        from pmdarima import ARIMA
+
+        state = self.warm_start
+        if state is None or state["refits"] + 1 >= self.search_every:
+            return False
+        arima = ARIMA(
+            order=state["order"],
+            seasonal_order=state["seasonal_order"],
+            with_intercept=state["with_intercept"],
+            suppress_warnings=True,
+        ).fit(y=y, X=X, **fit_args)
+        if numpy.mean(arima.resid() ** 2) > state["mse"] * (1 + self.search_tolerance):
+            logger.info(f"Fit of node {self.node.key} degraded, searching orders again")
+            return False
+        self.model = arima
+        self.refits = state["refits"] + 1
+        return True
+
     def fit(self, **fit_args) -> "TimeSeriesModel":
         as_df = self.node.item
         end = self._get_transformed_data(as_series=True)
@@ -50,22 +96,30 @@ class AutoArimaModel(TimeSeriesModel):
         with warnings.catch_warnings():
             warnings.filterwarnings("ignore", category=UserWarning)
             warnings.filterwarnings("ignore", category=ConvergenceWarning)
-            self.model = self.model.fit(y=end, X=ex, **fit_args)
+            if not self._fit_pinned(end, ex, **fit_args):
+                self.model = self._get_model().fit(y=end, X=ex, **fit_args)
+                self.refits = 0
+            self._set_in_sample(self.model.predict_in_sample(X=ex))
         return self
 
+    def get_warm_start(self) -> Optional[Dict]:
+        arima = self._arima()
+        return {
+            "order": arima.order,
+            "seasonal_order": arima.seasonal_order,
+            "with_intercept": arima.with_intercept,
+            "mse": float(numpy.mean(arima.resid() ** 2)),
+            "refits": self.refits,
+        }
+
     def predict(
         self, node, steps_ahead=10, alpha=0.05, exogenous_df: pandas.DataFrame = None
     ):
-        if self.node.exogenous:
-            ex = node.item
-        else:
-            ex = None
-        in_sample_preds = self.model.predict_in_sample(X=ex, alpha=alpha)
         if self.node.exogenous:
             y_hat = self.model.predict(X=exogenous_df[self.node.exogenous], alpha=alpha, n_periods=steps_ahead)
         else:
             y_hat = self.model.predict(X=exogenous_df, alpha=alpha, n_periods=steps_ahead)
-        return self._set_results_return_self(in_sample_preds, y_hat)
+        return self._set_results_return_self(None, y_hat)
 
     def fit_predict(self, node: HierarchyTree, steps_ahead=10, alpha=0.05, **fit_args):
         return self.fit(**fit_args).predict(
@@ -99,27 +153,190 @@ class SarimaxModel(TimeSeriesModel):
     predict(self, node, steps_ahead: int = 10, alpha: float = 0.05)
         Predicts the n-step ahead forecast. Exogenous variables are required if models were
         fit using them
+
+    When warm started, the optimizer starts from the parameters of the previous fit.
     """
 
     def __init__(self, node: HierarchyTree, **kwargs):
         super().__init__(ModelT.sarimax.name, node, **kwargs)
 
     def fit(self, **fit_args) -> "TimeSeriesModel":
-        self.model = self.model.fit(disp=0, **fit_args)
+        model = self._get_model()
+        # Seed the optimizer with the parameters of the previous fit
+        if self.warm_start and "start_params" not in fit_args:
+            start_params = self.warm_start["start_params"]
+            if len(start_params) == len(model.param_names):
+                fit_args["start_params"] = start_params
+        self.model = model.fit(disp=0, **fit_args)
+        self._set_in_sample(self.model.get_prediction(dynamic=False).predicted_mean)
         return self
 
+    def get_warm_start(self) -> Optional[Dict]:
+        return {"start_params": numpy.asarray(self.model.params)}
+
     def predict(self, node, steps_ahead=10, alpha=0.05):
         if self.node.exogenous:
             ex = node.item
         else:
             ex = None
         y_hat = self.model.forecast(steps=steps_ahead, exog=ex).values
-        in_sample_preds = self.model.get_prediction(
-            dynamic=False, exog=ex
-        ).predicted_mean
-        return self._set_results_return_self(in_sample_preds, y_hat)
+        return self._set_results_return_self(None, y_hat)
 
     def fit_predict(self, node: HierarchyTree, steps_ahead=10, alpha=0.05, **fit_args):
         return self.fit(**fit_args).predict(
             node=node, steps_ahead=steps_ahead, alpha=alpha
         )
+
+
+# Upper bound on the size of the design matrices of a chunk of series
+_CHUNK_SIZE = 2 ** 23
+
+
+class _ARSpec(NamedTuple):
+    lags: int
+    intercept: bool
+
+
+def _lagged(y: numpy.ndarray, lags: int) -> numpy.ndarray:
+    """
+    Read-only strided view of shape ``(n, n_observations - lags, lags)`` holding, for every observation
+    after the first ``lags``, the ``lags`` previous ones, most recent first
+    """
+    n, n_obs = y.shape
+    start = y[:, lags - 1 :]
+    return as_strided(
+        start,
+        shape=(n, n_obs - lags, lags),
+        strides=(y.strides[0], y.strides[1], -y.strides[1]),
+        writeable=False,
+    )
+
+
+class BatchedARModel(BatchedTimeSeriesModel):
+    """
+    Autoregressive model with exogenous variables (ARX) of all the nodes of a hierarchy, fit by least squares.
+    The lagged design matrices of all the series are strided views of a single array, and the regressions are
+    solved together with one batched pseudo-inverse, instead of one state space model per node.
+
+    The model of a node is :math:`y_t = c + \\sum_{j=1}^{p} a_j y_{t-j} + \\beta x_t`, where :math:`x_t` are the
+    exogenous variables of the node. Nodes with fewer exogenous variables than others get zero columns, which
+    get zero coefficients. The first ``lags`` in-sample predictions are the observations themselves.
+
+    Attributes
+    ----------
+    model : _ARSpec
+        The number of lags and whether the models have an intercept
+
+    coefficients : numpy.ndarray
+        The coefficients of each node: intercept, lags, then exogenous variables
+
+    forecasts : Dict[str, pandas.DataFrame]
+        The in-sample predictions and forecasts of each node
+
+    Methods
+    -------
+    fit(self, **fit_args)
+        Fits the models of all the nodes. The least squares fit takes no arguments, any passed are rejected
+
+    predict(self, node=None, steps_ahead: int = 10, exogenous_df: pandas.DataFrame = None)
+        Predicts the n-step ahead forecast of all the nodes. Exogenous variables are required if models were
+        fit using them
+    """
+
+    def __init__(self, nodes: List[HierarchyTree], **kwargs):
+        self.coefficients = None
+        self._history = None
+        super().__init__(ModelT.ar_batched.name, nodes, **kwargs)
+
+    def create_model(self, lags: int = 1, intercept: bool = True, **kwargs) -> _ARSpec:
+        if kwargs:
+            raise InvalidArgumentException(
+                f"Arguments {sorted(kwargs)} are not supported by the batched AR model"
+            )
+        if lags < 1:
+            raise InvalidArgumentException(f"lags must be at least 1, got {lags}")
+        return _ARSpec(lags=lags, intercept=intercept)
+
+    def _exogenous(self, frames: List[pandas.DataFrame], n_obs: int) -> numpy.ndarray:
+        """
+        Exogenous variables of all the nodes, of shape ``(n, n_obs, max_exogenous)`` padded with zeros
+        """
+        width = max([len(node.exogenous) for node in self.nodes] + [0])
+        exogenous = numpy.zeros((len(self.nodes), n_obs, width))
+        for i, (node, frame) in enumerate(zip(self.nodes, frames)):
+            if node.exogenous:
+                exogenous[i, :, : len(node.exogenous)] = frame[node.exogenous].values
+        return exogenous
+
+    def _design(self, y: numpy.ndarray, exogenous: numpy.ndarray) -> numpy.ndarray:
+        lags = self.model.lags
+        columns = [_lagged(y, lags), exogenous[:, lags:]]
+        if self.model.intercept:
+            columns.insert(0, numpy.ones(y.shape[:1] + (y.shape[1] - lags, 1)))
+        return numpy.concatenate(columns, axis=2)
+
+    def fit(self, **fit_args) -> "BatchedARModel":
+        if fit_args:
+            raise InvalidArgumentException(
+                f"Fit arguments {sorted(fit_args)} are not supported by the batched AR model"
+            )
+        lags = self.model.lags
+        y = self._get_transformed_data()
+        n, n_obs = y.shape
+        exogenous = self._exogenous([node.item for node in self.nodes], n_obs)
+        width = int(self.model.intercept) + lags + exogenous.shape[2]
+        if n_obs - lags < width:
+            raise InvalidArgumentException(
+                f"At least {lags + width} observations are required, got {n_obs}"
+            )
+
+        self.coefficients = numpy.empty((n, width))
+        fitted = y.copy()
+        chunk = max(1, _CHUNK_SIZE // (n_obs * width))
+        for first in range(0, n, chunk):
+            part = slice(first, first + chunk)
+            design = self._design(y[part], exogenous[part])
+            target = y[part, lags:, None]
+            coefficients = numpy.linalg.pinv(design) @ target
+            self.coefficients[part] = coefficients[:, :, 0]
+            fitted[part, lags:] = (design @ coefficients)[:, :, 0]
+        self._history = y[:, -lags:].copy()
+        self._set_in_sample(fitted)
+        return self
+
+    def predict(
+        self,
+        node: HierarchyTree = None,
+        steps_ahead: int = 10,
+        exogenous_df: pandas.DataFrame = None,
+    ):
+        lags = self.model.lags
+        has_exogenous = any(node.exogenous for node in self.nodes)
+        if has_exogenous and exogenous_df is None:
+            raise MissingRegressorException(
+                "Exogenous variables were provided at fit step, hence are required at predict step"
+            )
+        if has_exogenous:
+            steps_ahead = len(exogenous_df)
+            exogenous = self._exogenous([exogenous_df] * len(self.nodes), steps_ahead)
+        else:
+            exogenous = numpy.zeros((len(self.nodes), steps_ahead, 0))
+
+        intercept = int(self.model.intercept)
+        constant = self.coefficients[:, 0] if intercept else 0.0
+        autoregressive = self.coefficients[:, intercept : intercept + lags]
+        regression = self.coefficients[:, intercept + lags :]
+
+        history = numpy.empty((len(self.nodes), lags + steps_ahead))
+        history[:, :lags] = self._history
+        for h in range(steps_ahead):
+            previous = history[:, h : h + lags][:, ::-1]
+            history[:, lags + h] = (
+                constant
+                + (autoregressive * previous).sum(axis=1)
+                + (regression * exogenous[:, h]).sum(axis=1)
+            )
+        return self._set_results_return_self(None, history[:, lags:])
+
+    def fit_predict(self, node: HierarchyTree = None, steps_ahead=10, **fit_args):
+        return self.fit(**fit_args).predict(node=node, steps_ahead=steps_ahead)
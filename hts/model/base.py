@@ -1,5 +1,5 @@
 import logging
-from typing import NamedTuple, Union
+from typing import Dict, List, NamedTuple, Optional, Union
 
 import numpy
 import pandas
@@ -14,6 +14,28 @@ from hts.transforms import BoxCoxTransformer, FunctionTransformer
 logger = logging.getLogger(__name__)
 
 
+def _make_transformer(transform: TransformT):
+    if transform is False or transform is None:
+        return FunctionTransformer(
+            func=TimeSeriesModelT._no_func, inv_func=TimeSeriesModelT._no_func
+        )
+    elif transform is True:
+        return BoxCoxTransformer()
+    elif isinstance(transform, tuple):
+        if not hasattr(transform, "func") or not hasattr(transform, "inv_func"):
+            raise ValueError(
+                "If passing a NamedTuple, it must have a `func` and `inv_func` parameters"
+            )
+        return FunctionTransformer(
+            func=getattr(transform, "func"), inv_func=getattr(transform, "inv_func")
+        )
+    else:
+        raise ValueError(
+            "Invalid transform passed. Use either `True` for default boxcox transform or "
+            "a `NamedTuple(func: Callable, inv_func: Callable)` for custom transforms"
+        )
+
+
 class TimeSeriesModel(TimeSeriesModelT):
     """Base class for the implementation of the underlying models.
     Inherits from scikit-learn base classes
@@ -32,7 +54,9 @@ class TimeSeriesModel(TimeSeriesModelT):
         transform : Bool or NamedTuple
         kwargs
             Keyword arguments to be passed to the model instantiation. See the documentation
-            of each of the actual model implementations for a more comprehensive treatment
+            of each of the actual model implementations for a more comprehensive treatment.
+            The underlying model is only instantiated when fitting, so wrappers are cheap to create and to
+            send to worker processes
         """
 
         if kind not in ModelT.names():
@@ -43,38 +67,42 @@ class TimeSeriesModel(TimeSeriesModelT):
         self.kind = kind
         self.node = node
         self.transform_function = self._set_transform(transform=transform)
-        self.model = self.create_model(**kwargs)
+        self.model_args = kwargs
+        self.model = None
         self.forecast = None
         self.residual = None
         self.mse = None
+        self.in_sample = None
+        self.warm_start: Optional[Dict] = None
+
+    def get_warm_start(self) -> Optional[Dict]:
+        """
+        State of the fitted model used to seed the next fit of the same node when warm starting, see
+        ``HTSRegressor(warm_start=True)``. ``None`` if the model does not support warm starts
+        """
+        return None
 
     def _set_transform(self, transform: TransformT):
-        if transform is False or transform is None:
-            return FunctionTransformer(func=self._no_func, inv_func=self._no_func)
-        elif transform is True:
-            return BoxCoxTransformer()
-        elif isinstance(transform, tuple):
-            if not hasattr(transform, "func") or not hasattr(transform, "inv_func"):
-                raise ValueError(
-                    "If passing a NamedTuple, it must have a `func` and `inv_func` parameters"
-                )
-            return FunctionTransformer(
-                func=getattr(transform, "func"), inv_func=getattr(transform, "inv_func")
-            )
-        else:
-            raise ValueError(
-                "Invalid transform passed. Use either `True` for default boxcox transform or "
-                "a `NamedTuple(func: Callable, inv_func: Callable)` for custom transforms"
-            )
+        return _make_transformer(transform)
+
+    def _set_in_sample(self, in_sample):
+        """
+        Keep the in-sample predictions, residuals and MSE, computed once when fitting so that predicting only
+        computes the forecast horizon
+        """
+        self.in_sample = self.transform_function.inverse_transform(in_sample)
+        self.residual = (
+            self.in_sample - self._get_transformed_data(as_series=True)
+        ).values
+        self.mse = numpy.mean(numpy.array(self.residual) ** 2)
 
     def _set_results_return_self(self, in_sample, y_hat):
-        in_sample = self.transform_function.inverse_transform(in_sample)
+        if in_sample is not None:
+            self._set_in_sample(in_sample)
         y_hat = self.transform_function.inverse_transform(y_hat)
         self.forecast = pandas.DataFrame(
-            {"yhat": numpy.concatenate([in_sample, y_hat])}
+            {"yhat": numpy.concatenate([self.in_sample, y_hat])}
         )
-        self.residual = (in_sample - self._get_transformed_data(as_series=True)).values
-        self.mse = numpy.mean(numpy.array(self.residual) ** 2)
         return self
 
     def _get_transformed_data(
@@ -88,6 +116,14 @@ class TimeSeriesModel(TimeSeriesModelT):
         else:
             return pandas.DataFrame({key: transformed})
 
+    def _get_model(self):
+        """
+        The underlying model, created from ``model_args`` on first use
+        """
+        if self.model is None:
+            self.model = self.create_model(**self.model_args)
+        return self.model
+
     def create_model(self, **kwargs):
 
         if self.kind == ModelT.holt_winters.name:
@@ -125,3 +161,95 @@ class TimeSeriesModel(TimeSeriesModelT):
 
     def fit_predict(self, node: HierarchyTree, **kwargs):
         return self.fit().predict(node)
+
+
+class BatchedTimeSeriesModel(TimeSeriesModelT):
+    """Base class for models fitting the series of all the nodes of a hierarchy at once, as array operations
+    over a ``(n_series, n_observations)`` matrix rather than one model per node. ``fit`` and ``predict`` are called
+    once for the whole hierarchy, and the results are kept per node key in ``forecasts``, ``errors`` and
+    ``residuals``, the same way ``HTSResult`` holds them
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        nodes: List[HierarchyTree],
+        transform: TransformT = False,
+        **kwargs,
+    ):
+        """
+        Parameters
+        ----------
+        kind : str
+            One of the batched model kinds, e.g. `holt_winters_batched`
+        nodes : List[HierarchyTree]
+            The nodes, all with series of the same length
+        transform : Bool or NamedTuple
+            Applied to each series separately
+        kwargs
+            Keyword arguments to be passed to the model instantiation
+        """
+        if kind not in ModelT.names():
+            raise InvalidArgumentException(
+                f'Model {kind} not valid. Pick one of: {" ".join(ModelT.names())}'
+            )
+        if len({len(node.item) for node in nodes}) > 1:
+            raise InvalidArgumentException(
+                "Batched models require the series of all the nodes to have the same length"
+            )
+
+        self.kind = kind
+        self.nodes = nodes
+        self.keys = [node.key for node in nodes]
+        self.transform_functions = [_make_transformer(transform) for _ in nodes]
+        self.model = self.create_model(**kwargs)
+        self.in_sample: Optional[Dict[str, numpy.ndarray]] = None
+        self.forecasts: Dict[str, pandas.DataFrame] = {}
+        self.errors: Dict[str, float] = {}
+        self.residuals: Dict[str, numpy.ndarray] = {}
+
+    def _get_transformed_data(self) -> numpy.ndarray:
+        """
+        Transformed series of all the nodes, one per row
+        """
+        n_obs = len(self.nodes[0].item) if self.nodes else 0
+        data = numpy.empty((len(self.nodes), n_obs))
+        for i, node in enumerate(self.nodes):
+            data[i] = self.transform_functions[i].transform(node.item[node.key])
+        return data
+
+    def _set_in_sample(self, in_sample: numpy.ndarray) -> None:
+        """
+        Keep the in-sample predictions, residuals and MSE of every node from the ``(n_series, n_observations)``
+        in-sample predictions, as :py:meth:`TimeSeriesModel._set_in_sample` does for a node
+        """
+        data = self._get_transformed_data()
+        self.in_sample = {}
+        for i, key in enumerate(self.keys):
+            self.in_sample[key] = self.transform_functions[i].inverse_transform(
+                in_sample[i]
+            )
+            self.residuals[key] = self.in_sample[key] - data[i]
+            self.errors[key] = numpy.mean(self.residuals[key] ** 2)
+
+    def _set_results_return_self(self, in_sample, y_hat):
+        """
+        Set the forecasts of every node from the ``(n_series, steps_ahead)`` forecasts
+        """
+        if in_sample is not None:
+            self._set_in_sample(in_sample)
+        for i, key in enumerate(self.keys):
+            forecast = self.transform_functions[i].inverse_transform(y_hat[i])
+            self.forecasts[key] = pandas.DataFrame(
+                {"yhat": numpy.concatenate([self.in_sample[key], forecast])}
+            )
+        return self
+
+    def create_model(self, **kwargs):
+        raise NotImplementedError
+
+    def fit(self, **fit_args) -> "BatchedTimeSeriesModel":
+        raise NotImplementedError
+
+    def predict(self, node: HierarchyTree = None, **predict_args):
+        raise NotImplementedError
@@ -1,6 +1,11 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy
+
 from hts._t import ModelT
+from hts.core.exceptions import InvalidArgumentException
 from hts.hierarchy import HierarchyTree
-from hts.model.base import TimeSeriesModel
+from hts.model.base import BatchedTimeSeriesModel, TimeSeriesModel
 
 
 class HoltWintersModel(TimeSeriesModel):
@@ -39,12 +44,278 @@ class HoltWintersModel(TimeSeriesModel):
 
     def predict(self, node: HierarchyTree, steps_ahead=10):
         y_hat = self._model.forecast(steps=steps_ahead).values
-        in_sample_preds = self._model.predict(start=0, end=-1).values
-        return self._set_results_return_self(in_sample_preds, y_hat)
+        return self._set_results_return_self(None, y_hat)
 
     def fit(self, **fit_args) -> "TimeSeriesModel":
-        self._model = self.model.fit(**fit_args)
+        self._model = self._get_model().fit(**fit_args)
+        self._set_in_sample(self._model.predict(start=0, end=-1).values)
         return self
 
     def fit_predict(self, node: HierarchyTree, steps_ahead=10, **fit_args):
         return self.fit(**fit_args).predict(node=node, steps_ahead=steps_ahead)
+
+
+class _HoltWintersSpec(NamedTuple):
+    trend: Optional[str]
+    seasonal: Optional[str]
+    seasonal_periods: int
+
+
+class _HoltWintersState(NamedTuple):
+    level: numpy.ndarray
+    trend: numpy.ndarray
+    season: numpy.ndarray
+    fitted: numpy.ndarray
+
+
+# Points per parameter of the initial grid, and halvings of the grid step
+# around the best point
+_GRID_POINTS = 5
+_REFINEMENTS = 8
+# Upper bound on the size of the state arrays of a chunk of series
+_CHUNK_SIZE = 2 ** 22
+_EPS = 1e-4
+
+
+def _initial_states(
+    y: numpy.ndarray, spec: _HoltWintersSpec
+) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Heuristic initial level, trend and season of each series, from its first one or two seasons
+    """
+    m = spec.seasonal_periods
+    trend = numpy.zeros(len(y))
+    if spec.seasonal:
+        level = y[:, :m].mean(axis=1)
+        season = y[:, :m] - level[:, None]
+        if spec.trend:
+            trend = (y[:, m : 2 * m].mean(axis=1) - level) / m
+    else:
+        season = numpy.zeros((len(y), 1))
+        if spec.trend:
+            trend = y[:, 1] - y[:, 0]
+        # The first prediction is the first observation
+        level = y[:, 0] - trend
+    return level, trend, season
+
+
+def _recursions(
+    y: numpy.ndarray,
+    params: numpy.ndarray,
+    spec: _HoltWintersSpec,
+    fitted: Optional[numpy.ndarray] = None,
+) -> Tuple[numpy.ndarray, _HoltWintersState]:
+    """
+    Run the additive error correction recursions of ``n`` series for ``k`` sets of parameters at once
+
+    Parameters
+    ----------
+    y : numpy.ndarray
+        Series of shape ``(n, n_observations)``
+    params : numpy.ndarray
+        Smoothing parameters of shape ``(n, k, n_params)``, level first, then trend and seasonal if any
+    spec : _HoltWintersSpec
+    fitted : numpy.ndarray
+        Optional output of shape ``(n, k, n_observations)`` for the one step ahead predictions
+
+    Returns
+    -------
+    Tuple[numpy.ndarray, _HoltWintersState]
+        The sum of squared errors of shape ``(n, k)``, and the final states
+    """
+    n, k, _ = params.shape
+    alpha = params[:, :, 0]
+    beta = params[:, :, 1] if spec.trend else None
+    gamma = params[:, :, -1] if spec.seasonal else None
+    level, trend, season = _initial_states(y, spec)
+    level = numpy.repeat(level[:, None], k, axis=1)
+    trend = numpy.repeat(trend[:, None], k, axis=1)
+    season = numpy.repeat(season[:, None, :], k, axis=1)
+    m = season.shape[2]
+
+    sse = numpy.zeros((n, k))
+    for t in range(y.shape[1]):
+        obs = y[:, t, None]
+        phase = t % m
+        prediction = level + trend + season[:, :, phase]
+        if fitted is not None:
+            fitted[:, :, t] = prediction
+        sse += (obs - prediction) ** 2
+        previous = level + trend
+        level = alpha * (obs - season[:, :, phase]) + (1 - alpha) * previous
+        if spec.trend:
+            trend = beta * (level - previous + trend) + (1 - beta) * trend
+        if spec.seasonal:
+            season[:, :, phase] = (
+                gamma * (obs - previous) + (1 - gamma) * season[:, :, phase]
+            )
+    return sse, _HoltWintersState(level, trend, season, fitted)
+
+
+def _grid(
+    center: numpy.ndarray, step: float, points: int, fixed: numpy.ndarray
+) -> numpy.ndarray:
+    """
+    Candidate parameters of shape ``(n, points ** n_free, n_params)`` around ``center``, on a grid of the free
+    parameters. Parameters that are not free keep the value in ``center``
+    """
+    offsets = (numpy.arange(points) - (points - 1) / 2) * step
+    free = numpy.flatnonzero(~fixed)
+    mesh = numpy.stack(numpy.meshgrid(*[offsets] * len(free), indexing="ij"), -1)
+    candidates = numpy.repeat(center[:, None, :], mesh[..., 0].size, axis=1)
+    candidates[:, :, free] += mesh.reshape(-1, len(free))
+    return numpy.clip(candidates, _EPS, 1 - _EPS)
+
+
+def _optimize(
+    y: numpy.ndarray, spec: _HoltWintersSpec, start: numpy.ndarray, fixed: numpy.ndarray
+) -> numpy.ndarray:
+    """
+    Minimize the sum of squared errors of every series over the free smoothing parameters: a coarse grid
+    search, then grids of three points per parameter around the best candidate with a halving step
+    """
+    n_free = int((~fixed).sum())
+    if not n_free:
+        return start
+    step = 1 / _GRID_POINTS
+    center = start.copy()
+    center[:, ~fixed] = 0.5
+    candidates = _grid(center, step, _GRID_POINTS, fixed)
+    for _ in range(_REFINEMENTS + 1):
+        sse, _ = _recursions(y, candidates, spec)
+        best = candidates[numpy.arange(len(y)), numpy.nanargmin(sse, axis=1)]
+        step /= 2
+        candidates = _grid(best, step, 3, fixed)
+    return best
+
+
+class BatchedHoltWintersModel(BatchedTimeSeriesModel):
+    """
+    Additive Holt-Winters exponential smoothing of all the nodes of a hierarchy at once. The recursions and the
+    search of the smoothing parameters run for all the series (in chunks bounding memory) as ``numpy`` array
+    operations, instead of one ``ExponentialSmoothing`` model and optimizer per node.
+
+    The smoothing parameters minimize the in-sample sum of squared one step ahead errors, with a grid search
+    refined around the best point, and the initial states are set heuristically from the first seasons rather
+    than estimated, so results are close to but not the same as those of ``HoltWintersModel``.
+
+    Attributes
+    ----------
+    model : _HoltWintersSpec
+        The trend, seasonal and seasonal_periods of the models
+
+    params : numpy.ndarray
+        The smoothing parameters of each node, level first, then trend and seasonal if any
+
+    forecasts : Dict[str, pandas.DataFrame]
+        The in-sample predictions and forecasts of each node
+
+    Methods
+    -------
+    fit(self, smoothing_level=None, smoothing_trend=None, smoothing_seasonal=None, **fit_args)
+        Fits the models of all the nodes. Smoothing parameters that are passed are fixed instead of optimized,
+        other fit arguments are rejected
+
+    predict(self, node=None, steps_ahead: int = 10)
+        Predicts the n-step ahead forecast of all the nodes
+    """
+
+    def __init__(self, nodes: List[HierarchyTree], **kwargs):
+        self.params = None
+        self._state = None
+        super().__init__(ModelT.holt_winters_batched.name, nodes, **kwargs)
+
+    def create_model(
+        self,
+        trend: Optional[str] = None,
+        seasonal: Optional[str] = None,
+        seasonal_periods: Optional[int] = None,
+        **kwargs,
+    ) -> _HoltWintersSpec:
+        if kwargs:
+            raise InvalidArgumentException(
+                f"Arguments {sorted(kwargs)} are not supported by the batched Holt-Winters model"
+            )
+        for name, value in [("trend", trend), ("seasonal", seasonal)]:
+            if value not in (None, "add", "additive"):
+                raise InvalidArgumentException(
+                    f"Only additive components are supported, got {name}={value}"
+                )
+        if seasonal and (not seasonal_periods or seasonal_periods < 2):
+            raise InvalidArgumentException(
+                "seasonal_periods must be at least 2 for a seasonal model"
+            )
+        return _HoltWintersSpec(
+            trend=trend and "add",
+            seasonal=seasonal and "add",
+            seasonal_periods=seasonal_periods if seasonal else 1,
+        )
+
+    def fit(
+        self,
+        smoothing_level: Optional[float] = None,
+        smoothing_trend: Optional[float] = None,
+        smoothing_seasonal: Optional[float] = None,
+        **fit_args,
+    ) -> "BatchedHoltWintersModel":
+        if fit_args:
+            raise InvalidArgumentException(
+                f"Fit arguments {sorted(fit_args)} are not supported by the batched Holt-Winters model"
+            )
+        spec = self.model
+        y = self._get_transformed_data()
+        minimum = 2 * spec.seasonal_periods if spec.seasonal else 2
+        if y.shape[1] < minimum:
+            raise InvalidArgumentException(
+                f"At least {minimum} observations are required, got {y.shape[1]}"
+            )
+        missing = [key for key, row in zip(self.keys, y) if numpy.isnan(row).any()]
+        if missing:
+            raise InvalidArgumentException(f"Missing values in series: {missing}")
+
+        given = [smoothing_level]
+        if spec.trend:
+            given.append(smoothing_trend)
+        if spec.seasonal:
+            given.append(smoothing_seasonal)
+        fixed = numpy.array([value is not None for value in given])
+        start = numpy.array([0.5 if value is None else value for value in given])
+
+        n_candidates = max(_GRID_POINTS ** int((~fixed).sum()), 3 ** len(given))
+        chunk = max(1, _CHUNK_SIZE // (n_candidates * spec.seasonal_periods))
+        params, fitted, levels, trends, seasons = [], [], [], [], []
+        for first in range(0, len(y), chunk):
+            part = y[first : first + chunk]
+            best = _optimize(part, spec, numpy.tile(start, (len(part), 1)), fixed)
+            out = numpy.empty((len(part), 1, y.shape[1]))
+            _, state = _recursions(part, best[:, None, :], spec, fitted=out)
+            params.append(best)
+            fitted.append(out[:, 0])
+            levels.append(state.level[:, 0])
+            trends.append(state.trend[:, 0])
+            seasons.append(state.season[:, 0])
+
+        self.params = numpy.concatenate(params)
+        self._state = _HoltWintersState(
+            level=numpy.concatenate(levels),
+            trend=numpy.concatenate(trends),
+            season=numpy.concatenate(seasons),
+            fitted=numpy.concatenate(fitted),
+        )
+        self._set_in_sample(self._state.fitted)
+        return self
+
+    def predict(self, node: HierarchyTree = None, steps_ahead=10, exogenous_df=None):
+        state = self._state
+        n_obs = state.fitted.shape[1]
+        horizon = numpy.arange(1, steps_ahead + 1)
+        phases = (n_obs + horizon - 1) % state.season.shape[1]
+        y_hat = (
+            state.level[:, None]
+            + horizon * state.trend[:, None]
+            + state.season[:, phases]
+        )
+        return self._set_results_return_self(None, y_hat)
+
+    def fit_predict(self, node: HierarchyTree = None, steps_ahead=10, **fit_args):
+        return self.fit(**fit_args).predict(node=node, steps_ahead=steps_ahead)
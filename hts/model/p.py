@@ -83,10 +83,15 @@ class FBProphetModel(TimeSeriesModel):
         return df.reset_index(drop=True)
 
     def fit(self, **fit_args) -> "TimeSeriesModel":
+        # Creating the model adds the capacity columns to the data
+        model = self._get_model()
         df = self._pre_process(self.node.item)
         with suppress_stdout_stderr():
-            self.model = self.model.fit(df)
+            self.model = model.fit(df)
             self.model.stan_backend = None
+            self.in_sample = self.model.predict(df)
+        self.residual = (self.in_sample["yhat"] - df["y"]).values
+        self.mse = numpy.mean(numpy.array(self.residual) ** 2)
         return self
 
     def predict(
@@ -97,32 +102,23 @@ class FBProphetModel(TimeSeriesModel):
         exogenous_df: pandas.DataFrame = None,
     ):
 
-        df = self._pre_process(node.item)
-
+        # The history was predicted when fitting
         future = self.model.make_future_dataframe(
-            periods=steps_ahead, freq=freq, include_history=True
+            periods=steps_ahead, freq=freq, include_history=False
         )
         if exogenous_df is not None:
-            previous_exogenous_values = node.to_pandas()[node.exogenous].reset_index(
-                drop=True
-            )
-            future_exogenous = pandas.concat(
-                [previous_exogenous_values, exogenous_df]
-            ).reset_index(drop=True)
             future = pandas.concat(
-                [future, future_exogenous.reindex(future.index)], axis=1
+                [future, exogenous_df.reset_index(drop=True).reindex(future.index)],
+                axis=1,
             )
         if self.cap:
             future["cap"] = self.cap
         if self.floor:
             future["floor"] = self.floor
 
-        self.forecast = self.model.predict(future)
-        merged = pandas.merge(df, self.forecast, on="ds")
-        self.residual = (merged["yhat"] - merged["y"]).values
-        self.mse = numpy.mean(numpy.array(self.residual) ** 2)
-        if self.cap is not None:
-            self.forecast.yhat = numpy.exp(self.forecast.yhat)
+        self.forecast = pandas.concat(
+            [self.in_sample, self.model.predict(future)], ignore_index=True
+        )
         self.forecast.yhat = self.transform_function.inverse_transform(
             self.forecast.yhat
         )
@@ -1,44 +1,279 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Union
+
 import numpy
+from scipy import sparse
 
+from hts import defaults
 from hts._t import MethodT
 from hts.core.exceptions import InvalidArgumentException
 from hts.functions import (
+    CombinationFactor,
+    _bottom_rows,
+    _residual_matrix,
+    apply_combination,
+    combination_factor,
     forecast_proportions,
-    optimal_combination,
+    project,
     proportions,
     y_hat_matrix,
 )
 from hts.hierarchy.utils import make_iterable
 
 
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def fingerprint(sum_mat: Union[numpy.ndarray, sparse.spmatrix]) -> str:
+    """
+    Content hash of a dense or sparse summing matrix. Two dense, or two sparse, matrices with the same
+    shape and entries share the same fingerprint, regardless of their dtype or sparse format.
+
+    Parameters
+    ----------
+    sum_mat : Union[numpy.ndarray, scipy.sparse.spmatrix]
+
+    Returns
+    -------
+    str
+    """
+    digest = hashlib.sha1(str(sum_mat.shape).encode())
+    if sparse.issparse(sum_mat):
+        sum_mat = sparse.csr_matrix(sum_mat)
+        if not sum_mat.has_canonical_format:
+            sum_mat = sum_mat.copy()
+            sum_mat.sum_duplicates()
+        arrays = [sum_mat.indptr, sum_mat.indices, sum_mat.data]
+    else:
+        arrays = [sum_mat]
+    for array in arrays:
+        digest.update(numpy.ascontiguousarray(array, dtype=numpy.float64).data)
+    return digest.hexdigest()
+
+
+class ProjectionCache(object):
+    """
+    Bounded LRU cache of the factorized reconciliation projections computed by
+    :py:func:`hts.functions.combination_factor`. Entries are keyed by the fingerprint of the summing matrix,
+    the revision method and, for ``WLSV`` and ``MINT_*``, the in-sample errors or residuals, so reconciling the same hierarchy
+    over and over only computes the projection once.
+    """
+
+    def __init__(self, maxsize: int = defaults.PROJECTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(
+        sum_mat,
+        method: str,
+        mse: Optional[Dict[str, float]] = None,
+        residuals: Optional[Dict[str, numpy.ndarray]] = None,
+    ) -> str:
+        key = f"{method}:{fingerprint(sum_mat)}"
+        if method == MethodT.WLSV.name:
+            weights = numpy.hstack([mse[k] for k in mse.keys()])
+            key += f":{fingerprint(weights)}"
+        elif method in [MethodT.MINT_SAMPLE.name, MethodT.MINT_SHRINK.name]:
+            key += f":{fingerprint(_residual_matrix(residuals))}"
+        return key
+
+    def get(
+        self,
+        sum_mat: Union[numpy.ndarray, sparse.spmatrix],
+        method: str,
+        mse: Optional[Dict[str, float]] = None,
+        residuals: Optional[Dict[str, numpy.ndarray]] = None,
+    ) -> CombinationFactor:
+        """
+        Get the factorized projection for the summing matrix and method, computing it on a miss
+
+        Parameters
+        ----------
+        sum_mat : Union[numpy.ndarray, scipy.sparse.spmatrix]
+            The summing matrix
+        method : str
+            One of ``OLS``, ``WLSS``, ``WLSV``, ``MINT_SAMPLE``, ``MINT_SHRINK``
+        mse : Dict[str, float]
+            In-sample errors, only used by ``WLSV``
+        residuals : Dict[str, numpy.ndarray]
+            In-sample residuals, only used by ``MINT_SAMPLE`` and ``MINT_SHRINK``
+
+        Returns
+        -------
+        CombinationFactor
+            The factorized projection, to be applied with :py:func:`hts.functions.apply_combination`
+        """
+        key = self._key(sum_mat, method, mse, residuals)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        projection = combination_factor(
+            sum_mat=sum_mat, method=method, mse=mse, residuals=residuals
+        )
+
+        with self._lock:
+            if self.maxsize > 0:
+                self._entries[key] = projection
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return projection
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            maxsize=self.maxsize,
+            currsize=len(self._entries),
+        )
+
+
+PROJECTION_CACHE = ProjectionCache()
+
+
+class RevisedBatch(NamedTuple):
+    """
+    Result of :py:meth:`RevisionMethod.revise_batch`: revised forecasts of shape ``(scenarios, time steps, nodes)``
+    and the label of each node along the last axis
+    """
+
+    values: numpy.ndarray
+    labels: List[str]
+
+
 class RevisionMethod(object):
     def __init__(
         self,
         name: str,
-        sum_mat: numpy.ndarray,
+        sum_mat: Union[numpy.ndarray, sparse.spmatrix],
         transformer,
+        cache: Optional[ProjectionCache] = PROJECTION_CACHE,
     ):
         self.name = name
         self.transformer = transformer
         self.sum_mat = sum_mat
+        self.cache = cache
 
-    def _new_mat(self, y_hat_mat) -> numpy.ndarray:
-        new_mat = numpy.empty([y_hat_mat.shape[0], self.sum_mat.shape[0]])
-        for i in range(y_hat_mat.shape[0]):
-            new_mat[i, :] = numpy.dot(self.sum_mat, numpy.transpose(y_hat_mat[i, :]))
-        return new_mat
+    def _new_mat(self, y_hat_mat, out=None) -> numpy.ndarray:
+        return project(
+            hat_mat=y_hat_mat, sum_mat=self.sum_mat, optimal_mat=self.sum_mat, out=out
+        )
+
+    @staticmethod
+    def _to_out(revised: numpy.ndarray, out=None) -> numpy.ndarray:
+        if out is None:
+            return revised
+        out[...] = revised
+        return out
 
     def _y_hat_matrix(self, forecasts) -> numpy.ndarray:
-        n_cols = len(list(forecasts.keys())) + 1
-        if self.name == "BU":
-            keys = list(forecasts.keys())[
-                n_cols - self.sum_mat.shape[1] - 1 : n_cols - 1
-            ]
+        keys = list(forecasts.keys())
+        bottom_keys = [keys[row] for row in _bottom_rows(self.sum_mat)]
+        return y_hat_matrix(forecasts, keys=bottom_keys)
+
+    def _combination_factor(self, mse=None, residuals=None) -> CombinationFactor:
+        if self.cache is not None:
+            return self.cache.get(
+                self.sum_mat, method=self.name, mse=mse, residuals=residuals
+            )
+        return combination_factor(
+            sum_mat=self.sum_mat, method=self.name, mse=mse, residuals=residuals
+        )
+
+    def revise_batch(
+        self,
+        forecasts: numpy.ndarray,
+        mse: Optional[Dict[str, float]] = None,
+        residuals: Optional[Dict[str, numpy.ndarray]] = None,
+        labels: Optional[List[str]] = None,
+        out: Optional[numpy.ndarray] = None,
+    ) -> RevisedBatch:
+        """
+        Reconcile a batch of forecasts of the same hierarchy, e.g. one per scenario or quantile level, with a
+        single projection and a single matrix product
+
+        Parameters
+        ----------
+        forecasts : numpy.ndarray
+            Forecasts of shape ``(scenarios, time steps, nodes)``, with nodes ordered as the rows of the summing matrix
+        mse : Dict[str, float]
+            In-sample errors, required by ``WLSV``
+        residuals : Dict[str, numpy.ndarray]
+            In-sample residuals, required by ``MINT_SAMPLE`` and ``MINT_SHRINK``
+        labels : List[str]
+            Label of each node, defaults to the positions of the nodes
+        out : numpy.ndarray
+            Optional preallocated C-contiguous buffer of the same shape as ``forecasts``
+
+        Returns
+        -------
+        RevisedBatch
+        """
+        forecasts = numpy.asarray(forecasts, dtype=numpy.float64)
+        n_nodes = self.sum_mat.shape[0]
+        if forecasts.ndim != 3 or forecasts.shape[2] != n_nodes:
+            raise InvalidArgumentException(
+                f"Forecasts must be of shape (scenarios, time steps, {n_nodes}), got {forecasts.shape}"
+            )
+        if labels is None:
+            labels = list(range(n_nodes))
+        elif len(labels) != n_nodes:
+            raise InvalidArgumentException(
+                f"Got {len(labels)} labels for {n_nodes} nodes"
+            )
+        if out is None:
+            out = numpy.empty(forecasts.shape)
+        elif out.shape != forecasts.shape or not out.flags.c_contiguous:
+            raise InvalidArgumentException(
+                f"`out` must be a C-contiguous array of shape {forecasts.shape}"
+            )
+
+        hat_mat = forecasts.reshape(-1, n_nodes)
+        flat_out = out.reshape(-1, n_nodes)
+        if self.name == MethodT.NONE.name:
+            flat_out[...] = hat_mat
+        elif self.name in [
+            MethodT.OLS.name,
+            MethodT.WLSS.name,
+            MethodT.WLSV.name,
+            MethodT.MINT_SAMPLE.name,
+            MethodT.MINT_SHRINK.name,
+        ]:
+            factor = self._combination_factor(mse=mse, residuals=residuals)
+            apply_combination(
+                hat_mat=hat_mat, sum_mat=self.sum_mat, factor=factor, out=flat_out
+            )
+        elif self.name == MethodT.BU.name:
+            self._new_mat(hat_mat[:, _bottom_rows(self.sum_mat)], out=flat_out)
         else:
-            keys = range(n_cols - self.sum_mat.shape[1] - 1, n_cols - 1)
-        return y_hat_matrix(forecasts, keys=keys)
+            raise InvalidArgumentException(
+                f"Revision method {self.name} does not support batched revision"
+            )
+        return RevisedBatch(values=out, labels=labels)
 
-    def revise(self, forecasts=None, mse=None, nodes=None) -> numpy.ndarray:
+    def revise(
+        self, forecasts=None, mse=None, nodes=None, residuals=None, out=None
+    ) -> numpy.ndarray:
         """
 
 
@@ -47,22 +282,36 @@ class RevisionMethod(object):
         forecasts
         mse
         nodes
+        residuals : Dict[str, numpy.ndarray]
+            In-sample residuals of each node, required by ``MINT_SAMPLE`` and ``MINT_SHRINK``
+        out : numpy.ndarray
+            Optional preallocated buffer of shape ``(time steps, nodes)`` the revised forecasts are written to
 
         Returns
         -------
 
         """
         if self.name == MethodT.NONE.name:
-            return y_hat_matrix(forecasts=forecasts)
+            return y_hat_matrix(forecasts=forecasts, out=out)
 
-        if self.name in [MethodT.OLS.name, MethodT.WLSS.name, MethodT.WLSV.name]:
-            return optimal_combination(
-                forecasts=forecasts, sum_mat=self.sum_mat, method=self.name, mse=mse
+        if self.name in [
+            MethodT.OLS.name,
+            MethodT.WLSS.name,
+            MethodT.WLSV.name,
+            MethodT.MINT_SAMPLE.name,
+            MethodT.MINT_SHRINK.name,
+        ]:
+            factor = self._combination_factor(mse=mse, residuals=residuals)
+            return apply_combination(
+                hat_mat=y_hat_matrix(forecasts),
+                sum_mat=self.sum_mat,
+                factor=factor,
+                out=out,
             )
 
         elif self.name == MethodT.BU.name:
             y_hat = self._y_hat_matrix(forecasts)
-            return self._new_mat(y_hat)
+            return self._new_mat(y_hat, out=out)
 
         elif self.name in [MethodT.AHP.name, MethodT.PHA.name]:
             if self.transformer:
@@ -73,10 +322,10 @@ class RevisionMethod(object):
             y_hat = proportions(
                 nodes=nodes, forecasts=forecasts, sum_mat=self.sum_mat, method=self.name
             )
-            return self._new_mat(y_hat)
+            return self._new_mat(y_hat, out=out)
 
         elif self.name == MethodT.FP.name:
-            return forecast_proportions(forecasts, nodes)
+            return self._to_out(forecast_proportions(forecasts, nodes), out)
 
         else:
             raise InvalidArgumentException("Revision model name is invalid")
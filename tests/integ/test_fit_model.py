@@ -51,6 +51,23 @@ def test_fit_predict_fb_model_uv(uv_tree):
     assert isinstance(fb.mse, float)
 
 
+def test_fit_predict_fb_model_capacity(uv_tree):
+    cap = 2 * uv_tree.get_series().max()
+    fb = FBProphetModel(node=uv_tree, capacity_max=cap)
+    fb.fit()
+    assert fb.model.growth == "logistic"
+    fb.predict(uv_tree, steps_ahead=3)
+    forecast = fb.forecast
+    assert len(forecast) == len(uv_tree.item) + 3
+    assert (forecast.trend <= cap).all()
+    # Forecasts are Prophet's, in the scale of the data
+    numpy.testing.assert_allclose(
+        forecast.yhat,
+        forecast.trend * (1 + forecast.multiplicative_terms)
+        + forecast.additive_terms,
+    )
+
+
 def test_fit_predict_ar_model_mv(mv_tree):
     ar = AutoArimaModel(node=mv_tree)
     ar.fit(max_iter=1)
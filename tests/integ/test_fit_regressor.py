@@ -1,9 +1,14 @@
 from datetime import timedelta
 
+import numpy
 import pandas
+import pytest
 
 from hts import HTSRegressor
+from hts.core.exceptions import InvalidArgumentException, MissingRegressorException
 from hts.core.result import HTSResult
+from hts.hierarchy import HierarchyTree, make_iterable
+from hts.model import BatchedARModel, BatchedHoltWintersModel, HoltWintersModel
 
 
 def test_instantiate_regressor():
@@ -103,3 +108,195 @@ def test_exog_fit_predict_fb_model(hierarchical_mv_data, mv_tree_empty):
             assert column in model.hts_result.errors
             assert column in model.hts_result.forecasts
             assert column in model.hts_result.residuals
+
+
+def test_predict_regressor_batched(load_df_and_hier_visnights):
+    hierarchical_vis_data, vis_hier = load_df_and_hier_visnights
+    hvd = hierarchical_vis_data
+    ht = HTSRegressor(
+        model="holt_winters_batched",
+        revision_method="OLS",
+        trend="add",
+        seasonal="add",
+        seasonal_periods=4,
+    )
+    ht.fit(df=hvd, nodes=vis_hier)
+    model = ht.hts_result.models["total"]
+    assert all(m is model for m in ht.hts_result.models.values())
+    assert ((model.params > 0) & (model.params < 1)).all()
+
+    preds = ht.predict(steps_ahead=4)
+    assert len(preds) == len(hvd) + 4
+    numpy.testing.assert_allclose(preds["total"], preds[vis_hier["total"]].sum(axis=1))
+    for key in ["total", "NSW", "NSW_Metro"]:
+        assert len(ht.hts_result.forecasts[key]) == len(hvd) + 4
+        assert len(ht.hts_result.residuals[key]) == len(hvd)
+        assert ht.hts_result.errors[key] > 0
+
+
+def test_batched_holt_winters(uv_tree):
+    nodes = make_iterable(uv_tree, prop=None)
+    batched = BatchedHoltWintersModel(nodes=nodes, trend="add").fit()
+    batched.predict(steps_ahead=5)
+
+    # Every series is fit independently of the others in the batch
+    single = BatchedHoltWintersModel(nodes=nodes[2:3], trend="add").fit()
+    single.predict(steps_ahead=5)
+    key = nodes[2].key
+    numpy.testing.assert_allclose(single.params[0], batched.params[2])
+    pandas.testing.assert_frame_equal(single.forecasts[key], batched.forecasts[key])
+
+    # Fixed parameters are not optimized, a line is extrapolated
+    index = pandas.date_range("2021-01-01", periods=30, freq="D")
+    line = HierarchyTree(
+        key="line", item=pandas.DataFrame({"line": 2.0 * numpy.arange(30)}, index=index)
+    )
+    model = BatchedHoltWintersModel(nodes=[line], trend="add")
+    model.fit(smoothing_level=0.5).predict(steps_ahead=3)
+    assert model.params[0, 0] == 0.5
+    numpy.testing.assert_allclose(
+        model.forecasts["line"]["yhat"].values[-3:], [60.0, 62.0, 64.0]
+    )
+
+    with pytest.raises(InvalidArgumentException):
+        BatchedHoltWintersModel(nodes=nodes, trend="mul")
+    with pytest.raises(InvalidArgumentException):
+        BatchedHoltWintersModel(nodes=nodes, seasonal="add")
+    with pytest.raises(InvalidArgumentException):
+        BatchedHoltWintersModel(nodes=nodes, damped_trend=True)
+    with pytest.raises(InvalidArgumentException):
+        BatchedHoltWintersModel(nodes=nodes).fit_predict(steps_ahead=3, optimized=False)
+
+    gap = line.item.copy()
+    gap.iloc[10] = numpy.nan
+    with pytest.raises(InvalidArgumentException):
+        BatchedHoltWintersModel(
+            nodes=[HierarchyTree(key="line", item=gap)], trend="add"
+        ).fit()
+
+
+def test_batched_ar(load_df_and_hier_visnights):
+    rng = numpy.random.default_rng(0)
+    index = pandas.date_range("2021-01-01", periods=200, freq="D")
+    x = rng.normal(size=210)
+    y = numpy.zeros(210)
+    for t in range(2, 210):
+        y[t] = 1.0 + 0.5 * y[t - 1] - 0.2 * y[t - 2] + 2.0 * x[t]
+    df = pandas.DataFrame(
+        {"total": 2 * y[:200], "a": y[:200], "b": y[:200], "x": x[:200]}, index=index
+    )
+    tree = HierarchyTree.from_nodes({"total": ["a", "b"]}, df, exogenous={"a": ["x"]})
+    nodes = make_iterable(tree, prop=None)
+    model = BatchedARModel(nodes=nodes, lags=2).fit()
+
+    # Same coefficients as a least squares fit of each node
+    for i, node in enumerate(nodes):
+        series = node.item[node.key].values
+        design = numpy.column_stack(
+            [numpy.ones(198), series[1:-1], series[:-2]]
+            + [node.item[col].values[2:] for col in node.exogenous]
+        )
+        expected = numpy.linalg.lstsq(design, series[2:], rcond=None)[0]
+        numpy.testing.assert_allclose(
+            model.coefficients[i, : design.shape[1]], expected, atol=1e-8
+        )
+    numpy.testing.assert_allclose(model.coefficients[1], [1.0, 0.5, -0.2, 2.0])
+
+    future = pandas.DataFrame({"x": x[200:]})
+    model.predict(exogenous_df=future)
+    numpy.testing.assert_allclose(
+        model.forecasts["a"]["yhat"].values, numpy.concatenate([y[:2], y[2:]])
+    )
+    with pytest.raises(MissingRegressorException):
+        model.predict(steps_ahead=3)
+    with pytest.raises(InvalidArgumentException):
+        model.fit(maxiter=10)
+
+    hierarchical_vis_data, vis_hier = load_df_and_hier_visnights
+    ht = HTSRegressor(model="ar_batched", revision_method="OLS", lags=2)
+    ht.fit(df=hierarchical_vis_data, nodes=vis_hier)
+    preds = ht.predict(steps_ahead=4)
+    assert len(preds) == len(hierarchical_vis_data) + 4
+    numpy.testing.assert_allclose(preds["total"], preds[vis_hier["total"]].sum(axis=1))
+
+
+def test_warm_start(load_df_and_hier_uv):
+    hierarchical_sine_data, sine_hier = load_df_and_hier_uv
+    hsd = hierarchical_sine_data.head(100)
+
+    ht = HTSRegressor(model="sarimax", revision_method="OLS", n_jobs=0, warm_start=True)
+    ht.fit(df=hsd.head(90), nodes=sine_hier)
+    assert ht.hts_result.models["total"].warm_start is None
+    previous = ht.hts_result.models["total"].model.params
+    ht.fit(df=hsd, nodes=sine_hier)
+    numpy.testing.assert_allclose(
+        ht.hts_result.models["total"].warm_start["start_params"], previous
+    )
+    assert len(ht.predict(steps_ahead=2)) == len(hsd) + 2
+
+    ht = HTSRegressor(
+        model="auto_arima",
+        revision_method="OLS",
+        n_jobs=0,
+        warm_start=True,
+        search_every=2,
+        # The sine data is random, only the schedule triggers a search at first
+        search_tolerance=numpy.inf,
+        seasonal=False,
+        start_p=0,
+        max_p=1,
+        start_q=0,
+        max_q=1,
+    )
+    ht.fit(df=hsd.head(90), nodes=sine_hier)
+    first = ht.hts_result.models["a"]
+    assert first.refits == 0
+    # The previous order is refit, and searched again on schedule
+    ht.fit(df=hsd.head(95), nodes=sine_hier)
+    second = ht.hts_result.models["a"]
+    assert second.refits == 1
+    assert second.model.order == first.model.model_.order
+    assert len(ht.predict(steps_ahead=2)) == 97
+    ht.fit(df=hsd, nodes=sine_hier)
+    assert ht.hts_result.models["a"].refits == 0
+
+    # Degraded fits trigger a search
+    ht.model_args["search_tolerance"] = -1.0
+    ht.fit(df=hsd, nodes=sine_hier)
+    assert ht.hts_result.models["a"].refits == 0
+
+
+def test_predict_reuses_in_sample(load_df_and_hier_visnights):
+    hierarchical_vis_data, vis_hier = load_df_and_hier_visnights
+    hvd = hierarchical_vis_data
+    ht = HTSRegressor(model="holt_winters", revision_method="OLS", n_jobs=0)
+    ht.fit(df=hvd, nodes=vis_hier)
+    model = ht.hts_result.models["total"]
+    assert len(model.in_sample) == len(hvd)
+    mse = model.mse
+
+    def in_sample_prediction(*args, **kwargs):
+        raise AssertionError("In-sample predictions are computed when fitting")
+
+    for fitted in ht.hts_result.models.values():
+        fitted._model.predict = in_sample_prediction
+    for steps_ahead in [2, 5]:
+        preds = ht.predict(steps_ahead=steps_ahead)
+        assert len(preds) == len(hvd) + steps_ahead
+        assert ht.hts_result.errors["total"] == mse
+
+
+def test_lightweight_models(load_df_and_hier_visnights):
+    hierarchical_vis_data, vis_hier = load_df_and_hier_visnights
+    tree = HierarchyTree.from_nodes(vis_hier, hierarchical_vis_data)
+    model = HoltWintersModel(node=tree, trend="add")
+    # The underlying model is created when fitting
+    assert model.model is None
+    model.fit()
+    assert model.model is not None
+
+    ht = HTSRegressor(model="holt_winters", revision_method="OLS")
+    ht.fit(tree=tree)
+    for fitted in ht.hts_result.models.values():
+        assert fitted.node.children == [] and fitted.node.parent is None
+    assert len(ht.predict(steps_ahead=2)) == len(hierarchical_vis_data) + 2
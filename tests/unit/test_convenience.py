@@ -96,3 +96,14 @@ def test_convenience(load_df_and_hier_uv):
 
     rev = revise_forecasts("AHP", nodes=ht.nodes, forecasts=ht.hts_result.forecasts)
     assert isinstance(rev, pandas.DataFrame)
+
+    # MinT forecasts are coherent with the default dense summing matrix
+    for method in ["MINT_SAMPLE", "MINT_SHRINK"]:
+        rev = revise_forecasts(
+            method,
+            nodes=ht.nodes,
+            forecasts=ht.hts_result.forecasts,
+            residuals=ht.hts_result.residuals,
+        )
+        for parent, children in hier.items():
+            numpy.testing.assert_allclose(rev[parent], rev[children].sum(axis=1))
@@ -1,13 +1,27 @@
 import numpy
 import pandas
+import pytest
+from scipy import sparse
 
 import hts.hierarchy
 from hts.functions import (
+    _bottom_rows,
     _create_bl_str_col,
+    _mint_weighted_sum_mat,
+    apply_combination,
+    combination_factor,
+    forecast_proportions,
     get_agg_series,
     get_hierarchichal_df,
+    project,
+    read_long_format,
+    shrinkage_intensity,
+    stream_hierarchichal_df,
+    to_sparse_sum_mat,
     to_sum_mat,
+    y_hat_matrix,
 )
+from hts.hierarchy import make_iterable
 
 
 def test_sum_mat_uv(uv_tree):
@@ -61,6 +75,67 @@ def test_sum_mat_hierarchical():
     assert sum_mat_labels == ["total", "B", "A", "A_X", "A_Y", "A_Z", "B_X", "B_Y"]
 
 
+def test_sparse_sum_mat_hierarchical():
+    hierarchy = {"total": ["A", "B"], "A": ["A_X", "A_Y", "A_Z"], "B": ["B_X", "B_Y"]}
+    hier_df = pandas.DataFrame(
+        data={
+            "total": [],
+            "A": [],
+            "B": [],
+            "A_X": [],
+            "A_Y": [],
+            "A_Z": [],
+            "B_X": [],
+            "B_Y": [],
+        }
+    )
+
+    tree = hts.hierarchy.HierarchyTree.from_nodes(hierarchy, hier_df)
+    sum_mat, sum_mat_labels = to_sparse_sum_mat(tree)
+
+    expected_sum_mat = numpy.array(
+        [
+            [1, 1, 1, 1, 1],  # total
+            [1, 1, 1, 0, 0],  # A
+            [0, 0, 0, 1, 1],  # B
+            [1, 0, 0, 0, 0],  # A_X
+            [0, 1, 0, 0, 0],  # A_Y
+            [0, 0, 1, 0, 0],  # A_Z
+            [0, 0, 0, 1, 0],  # B_X
+            [0, 0, 0, 0, 1],  # B_Y
+        ]
+    )
+
+    assert sparse.issparse(sum_mat)
+    numpy.testing.assert_array_equal(sum_mat.toarray(), expected_sum_mat)
+    assert sum_mat_labels == ["total", "A", "B", "A_X", "A_Y", "A_Z", "B_X", "B_Y"]
+    numpy.testing.assert_array_equal(_bottom_rows(sum_mat), [3, 4, 5, 6, 7])
+
+
+def test_sparse_sum_mat_unbalanced():
+    hierarchy = {"total": ["A", "B"], "A": ["A_X", "A_Y"], "A_X": ["A_X_1"]}
+    hier_df = pandas.DataFrame(
+        data={"total": [], "A": [], "B": [], "A_X": [], "A_Y": [], "A_X_1": []}
+    )
+
+    tree = hts.hierarchy.HierarchyTree.from_nodes(hierarchy, hier_df)
+    sum_mat, sum_mat_labels = to_sparse_sum_mat(tree)
+
+    assert sum_mat_labels == make_iterable(tree)
+    assert sum_mat.shape == (6, 3)
+    # B, A_Y and A_X_1 are the leaves, A_X only aggregates A_X_1
+    numpy.testing.assert_array_equal(sum_mat.toarray()[0], [1, 1, 1])
+    numpy.testing.assert_array_equal(sum_mat.toarray()[1], [0, 1, 1])
+    numpy.testing.assert_array_equal(_bottom_rows(sum_mat), [2, 4, 5])
+
+
+def test_sparse_sum_mat_matches_dense(uv_tree):
+    dense, dense_labels = to_sum_mat(uv_tree)
+    sparse_mat, sparse_labels = to_sparse_sum_mat(uv_tree)
+    order = [dense_labels.index(label) for label in sparse_labels]
+    numpy.testing.assert_array_equal(sparse_mat.toarray(), dense[order])
+
+
 def test_sum_mat_grouped():
     hierarchy = {
         "total": ["A", "B", "X", "Y"],
@@ -329,3 +404,285 @@ def test_create_bl_str_col():
     col = _create_bl_str_col(grouped_df, ["lev1", "lev2"])
 
     assert col == ["A_X", "A_Y", "B_Z"]
+
+
+def test_grouped_create_df_sum_mat():
+    hier_df = pandas.DataFrame(
+        data={
+            "ds": ["2020-01", "2020-02"] * 4,
+            "lev1": ["A", "A", "A", "A", "BA", "BA", "BA", "BA"],
+            "lev2": ["X_1", "X_1", "Y", "Y", "X_1", "X_1", "Y", "Y"],
+            "val": [1, 2, 3, 4, 5, 6, 7, 8],
+        }
+    )
+
+    gts_df, sum_mat, sum_mat_labels = get_hierarchichal_df(
+        hier_df,
+        level_names=["lev1", "lev2"],
+        hierarchy=[["lev1"], ["lev2"]],
+        date_colname="ds",
+        val_colname="val",
+    )
+
+    # "A" is a substring of "BA" and "X_1" contains the delimiter, neither affects membership
+    expected_sum_mat = numpy.array(
+        [
+            [1, 1, 1, 1],  # total
+            [0, 1, 0, 1],  # Y
+            [1, 0, 1, 0],  # X_1
+            [0, 0, 1, 1],  # BA
+            [1, 1, 0, 0],  # A
+            [1, 0, 0, 0],  # A_X_1
+            [0, 1, 0, 0],  # A_Y
+            [0, 0, 1, 0],  # BA_X_1
+            [0, 0, 0, 1],  # BA_Y
+        ]
+    )
+    numpy.testing.assert_array_equal(sum_mat, expected_sum_mat)
+    assert sum_mat_labels == [
+        "total",
+        "Y",
+        "X_1",
+        "BA",
+        "A",
+        "A_X_1",
+        "A_Y",
+        "BA_X_1",
+        "BA_Y",
+    ]
+    numpy.testing.assert_array_equal(
+        gts_df[sum_mat_labels[5:]].values @ sum_mat.T, gts_df[sum_mat_labels].values
+    )
+
+
+def test_grouped_create_df_input_untouched():
+    hier_df = pandas.DataFrame(
+        data={
+            "ds": ["2020-02", "2020-01"] * 3,
+            "lev1": ["A", "A", "A", "B", "B", "B"],
+            "lev2": ["X", "X", "Y", "X", "Y", "Y"],
+            "val": [1, 2, 3, 4, 5, 6],
+        }
+    )
+    original = hier_df.copy()
+
+    gts_df, _, _ = get_hierarchichal_df(
+        hier_df,
+        level_names=["lev1", "lev2"],
+        hierarchy=[["lev1"], ["lev2"]],
+        date_colname="ds",
+        val_colname="val",
+    )
+    pandas.testing.assert_frame_equal(hier_df, original)
+    assert list(gts_df.index) == ["2020-01", "2020-02"]
+    # Missing bottom level values are NaN, aggregates skip them
+    assert numpy.isnan(gts_df.loc["2020-01", "A_Y"])
+    assert numpy.isnan(gts_df.loc["2020-02", "B_X"])
+    assert gts_df.loc["2020-01", "Y"] == 6
+    assert gts_df.loc["2020-01", "total"] == 2 + 4 + 6
+
+    # Bottom level columns are sorted whatever the order the series appear in
+    reversed_df, reversed_sum_mat, reversed_labels = get_hierarchichal_df(
+        hier_df.iloc[::-1],
+        level_names=["lev1", "lev2"],
+        hierarchy=[["lev1"], ["lev2"]],
+        date_colname="ds",
+        val_colname="val",
+    )
+    assert list(reversed_df.columns[:4]) == ["A_X", "A_Y", "B_X", "B_Y"]
+    pandas.testing.assert_frame_equal(reversed_df[gts_df.columns], gts_df)
+    bottom = reversed_df[reversed_labels[-4:]].fillna(0).values
+    numpy.testing.assert_allclose(
+        bottom @ reversed_sum_mat.T, reversed_df[reversed_labels].fillna(0).values
+    )
+
+    with pytest.raises(ValueError):
+        get_hierarchichal_df(
+            pandas.concat([hier_df, hier_df.head(1)]),
+            level_names=["lev1", "lev2"],
+            hierarchy=[["lev1"], ["lev2"]],
+            date_colname="ds",
+            val_colname="val",
+        )
+
+
+def test_project(uv_tree):
+    sum_mat, _ = to_sparse_sum_mat(uv_tree)
+    hat_mat = numpy.random.rand(7, sum_mat.shape[0])
+    optimal_mat = numpy.random.rand(sum_mat.shape[0], sum_mat.shape[0])
+    expected = numpy.array([optimal_mat.dot(row) for row in hat_mat])
+
+    numpy.testing.assert_allclose(project(hat_mat, sum_mat, optimal_mat), expected)
+    numpy.testing.assert_allclose(
+        project(hat_mat, sum_mat, sparse.csr_matrix(optimal_mat)), expected
+    )
+
+    out = numpy.empty((7, sum_mat.shape[0]))
+    assert project(hat_mat, sum_mat, optimal_mat, out=out) is out
+    numpy.testing.assert_allclose(out, expected)
+
+    bottom = hat_mat[:, _bottom_rows(sum_mat)]
+    numpy.testing.assert_allclose(
+        project(bottom, sum_mat, sum_mat), bottom @ sum_mat.toarray().T
+    )
+
+
+def test_combination_factor(uv_tree):
+    sparse_mat, labels = to_sparse_sum_mat(uv_tree)
+    dense = sparse_mat.toarray()
+    hat_mat = numpy.random.rand(6, len(labels))
+    mse = {label: numpy.random.rand() for label in labels}
+
+    for method in ["OLS", "WLSS", "WLSV"]:
+        if method == "OLS":
+            w_inv = numpy.identity(len(labels))
+        elif method == "WLSS":
+            w_inv = numpy.diag(1 / dense.sum(axis=1))
+        else:
+            w_inv = numpy.diag(1 / (numpy.array(list(mse.values())) + 0.0000001))
+        expected_mat = (
+            dense @ numpy.linalg.inv(dense.T @ w_inv @ dense) @ dense.T @ w_inv
+        )
+        expected = hat_mat @ expected_mat.T
+
+        factor = combination_factor(sparse_mat, method=method, mse=mse)
+        assert factor.solver == "splu"
+        numpy.testing.assert_allclose(
+            apply_combination(hat_mat, sparse_mat, factor), expected
+        )
+
+        if method != "WLSV":
+            factor = combination_factor(dense, method=method, mse=mse)
+            assert factor.solver == "cholesky"
+            numpy.testing.assert_allclose(
+                apply_combination(hat_mat, dense, factor), expected
+            )
+
+
+def _naive_shrinkage(res):
+    n_obs = res.shape[0]
+    cov = res.T @ res / n_obs
+    std = numpy.sqrt(numpy.diag(cov))
+    corr = cov / numpy.outer(std, std)
+    xs = res / std
+    v = (xs ** 2).T @ (xs ** 2) - (xs.T @ xs) ** 2 / n_obs
+    v = v / (n_obs * (n_obs - 1))
+    numpy.fill_diagonal(v, 0)
+    d = (corr - numpy.identity(len(corr))) ** 2
+    lam = max(min(v.sum() / d.sum(), 1), 0)
+    return lam, lam * numpy.diag(numpy.diag(cov)) + (1 - lam) * cov
+
+
+def test_mint_shrinkage(uv_tree):
+    sum_mat, labels = to_sparse_sum_mat(uv_tree)
+    dense = sum_mat.toarray()
+    rng = numpy.random.RandomState(42)
+
+    # More observations than nodes, then more nodes than observations
+    for n_obs in [50, 8]:
+        res = rng.normal(size=(n_obs, len(labels))) + rng.normal(size=(n_obs, 1))
+        residuals = dict(zip(labels, res.T))
+        lam, cov = _naive_shrinkage(res)
+        assert numpy.isclose(shrinkage_intensity(res), lam)
+
+        cov[numpy.diag_indices_from(cov)] += 0.0000001
+        numpy.testing.assert_allclose(
+            _mint_weighted_sum_mat(sum_mat, residuals, shrink=True),
+            numpy.linalg.solve(cov, dense),
+            rtol=1e-5,
+        )
+
+    res = rng.normal(size=(50, len(labels)))
+    residuals = dict(zip(labels, res.T))
+    cov = res.T @ res / 50 + 0.0000001 * numpy.identity(len(labels))
+    numpy.testing.assert_allclose(
+        _mint_weighted_sum_mat(sum_mat, residuals, shrink=False),
+        numpy.linalg.solve(cov, dense),
+        rtol=1e-5,
+    )
+    with pytest.raises(ValueError):
+        _mint_weighted_sum_mat(sum_mat, dict(zip(labels, res[:8].T)), shrink=False)
+
+
+def test_y_hat_matrix():
+    forecasts = {
+        "total": pandas.DataFrame({"yhat": [1.0, 2.0, 3.0]}),
+        "a": pandas.Series([0.0, 0.0, 0.0], name="yhat").to_frame(),
+        "b": numpy.array([1.0, 2.0, 3.0]),
+    }
+    expected = numpy.array([[1.0, 0.0, 1.0], [2.0, 0.0, 2.0], [3.0, 0.0, 3.0]])
+    numpy.testing.assert_array_equal(y_hat_matrix(forecasts), expected)
+    numpy.testing.assert_array_equal(
+        y_hat_matrix(forecasts, keys=["a", "b"]), expected[:, 1:]
+    )
+
+    out = numpy.empty((3, 3))
+    assert y_hat_matrix(forecasts, out=out) is out
+    numpy.testing.assert_array_equal(out, expected)
+    with pytest.raises(ValueError):
+        y_hat_matrix(forecasts, out=numpy.empty((2, 3)))
+
+
+def test_forecast_proportions(uv_tree):
+    nodes = make_iterable(uv_tree, prop=None)
+    keys = [node.key for node in nodes]
+    hat_mat = numpy.random.rand(4, len(keys)) + 1
+    forecasts = {
+        key: pandas.DataFrame({"yhat": hat_mat[:, i]}) for i, key in enumerate(keys)
+    }
+
+    revised = forecast_proportions(forecasts, uv_tree)
+    numpy.testing.assert_array_equal(revised, forecast_proportions(forecasts, uv_tree))
+    numpy.testing.assert_allclose(revised[:, 0], hat_mat[:, 0])
+    for i, node in enumerate(nodes):
+        if not node.children:
+            continue
+        children = [keys.index(child.key) for child in node.children]
+        numpy.testing.assert_allclose(revised[:, children].sum(axis=1), revised[:, i])
+        shares = hat_mat[:, children] / hat_mat[:, children].sum(axis=1, keepdims=True)
+        numpy.testing.assert_allclose(revised[:, children], shares * revised[:, [i]])
+
+
+def test_stream_hierarchichal_df(tmp_path):
+    rng = numpy.random.RandomState(0)
+    n_rows = 500
+    long_df = pandas.DataFrame(
+        {
+            "ds": pandas.date_range("2020-01-01", periods=72, freq="H")[
+                rng.randint(0, 72, n_rows)
+            ],
+            "lev1": rng.choice(["A", "B"], n_rows),
+            "lev2": rng.choice(["X", "Y", "Z"], n_rows),
+            "val": rng.randint(0, 10, n_rows),
+        }
+    )
+    path = str(tmp_path / "long.csv")
+    long_df.to_csv(path, index=False)
+    kwargs = dict(
+        level_names=["lev1", "lev2"],
+        hierarchy=[["lev1"], ["lev2"]],
+        date_colname="ds",
+        val_colname="val",
+    )
+
+    daily = long_df.assign(ds=long_df["ds"].dt.floor("1D"))
+    expected_df, expected_sum_mat, expected_labels = get_hierarchichal_df(
+        daily.groupby(["ds", "lev1", "lev2"], as_index=False)["val"].sum(), **kwargs
+    )
+    wide_df, sum_mat, labels = stream_hierarchichal_df(
+        read_long_format(path, chunksize=37), freq="1D", **kwargs
+    )
+    assert sorted(labels) == sorted(expected_labels)
+    assert len(wide_df) == 3
+    pandas.testing.assert_frame_equal(
+        wide_df[expected_labels], expected_df[expected_labels]
+    )
+    numpy.testing.assert_array_equal(
+        wide_df[labels[-6:]].values @ sum_mat.T, wide_df[labels].values
+    )
+
+    hourly_df, _, _ = stream_hierarchichal_df(numpy.array_split(long_df, 7), **kwargs)
+    assert hourly_df["total"].sum() == long_df["val"].sum()
+
+    with pytest.raises(ValueError):
+        stream_hierarchichal_df([], **kwargs)
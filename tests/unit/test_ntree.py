@@ -1,7 +1,15 @@
+import logging
+import pickle
+import sys
+
+import numpy
 import pandas
+import pytest
 
 from hts._t import NAryTreeT
-from hts.hierarchy import HierarchyTree
+from hts.core.exceptions import InvalidArgumentException, MissingRegressorException
+from hts.hierarchy import HierarchyTree, make_iterable
+from hts.hierarchy.utils import groupify, hexify, resample_count
 
 
 def test_level_order_traversal(n_tree):
@@ -135,3 +143,397 @@ def test_create_mv_tree(hierarchical_mv_data):
     assert ht.get_node_height("BT-03") == 0
     assert ht.get_node_height("CBD-13") == 0
     assert ht.get_node_height("SLU") == 1
+
+
+def test_cached_traversals(n_tree):
+    assert n_tree.get_node("t") is n_tree
+    traversal = n_tree.traversal_level()
+    assert n_tree.traversal_level() == traversal
+    assert n_tree._index is not None
+
+    ab = n_tree.get_node("ab")
+    abc = ab.add_child(key="abc", item=3)
+    # Adding a node invalidates the cached traversals of all its ancestors
+    assert n_tree._index is None
+    assert n_tree.get_node("abc") is abc
+    assert n_tree.traversal_level()[3 + 6 + 4] is abc
+    assert n_tree.level_order_traversal() == [[3], [2, 2, 2], [2, 3, 2, 2, 2, 2]]
+    assert n_tree.get_level_order_labels()[-1][4] == "abc"
+    assert n_tree.get_node_height("ab") == 1
+    assert n_tree.num_nodes() == 22
+
+    restored = pickle.loads(pickle.dumps(n_tree))
+    assert restored.get_level_order_labels() == n_tree.get_level_order_labels()
+    assert abc.parent is ab
+
+
+def test_from_nodes_validation(caplog):
+    hier = {"total": ["a", "b"], "a": ["a_x", "a_y"], "z": ["z_x"]}
+    df = pandas.DataFrame(
+        numpy.random.rand(3, 6), columns=["total", "a", "b", "a_x", "a_y", "ex"]
+    )
+
+    with caplog.at_level(logging.WARNING):
+        ht = HierarchyTree.from_nodes(hier, df, exogenous={"a_x": ["ex"]})
+    assert "['z']" in caplog.text
+    assert ht.get_level_order_labels() == [["total"], ["a", "b"], ["a_x", "a_y"]]
+    assert ht.get_node("a_x").exogenous == ["ex"]
+    assert ht.get_node("a_x").parent is ht.get_node("a")
+
+    with pytest.raises(InvalidArgumentException, match="a_y"):
+        HierarchyTree.from_nodes(hier, df.drop(columns=["a_y"]))
+    with pytest.raises(MissingRegressorException):
+        HierarchyTree.from_nodes(hier, df, exogenous={"a_x": ["missing"]})
+    with pytest.raises(InvalidArgumentException):
+        HierarchyTree.from_nodes({"total": ["a"], "a": ["total"]}, df)
+
+
+def test_from_nodes_deep():
+    depth = 2000
+    hier = {f"n{i}": [f"n{i + 1}"] for i in range(depth)}
+    df = pandas.DataFrame(
+        numpy.ones((2, depth + 1)), columns=[f"n{i}" for i in range(depth + 1)]
+    )
+    ht = HierarchyTree.from_nodes(hier, df, root="n0")
+    assert ht.get_height() == depth
+    assert ht.get_node(f"n{depth}").is_leaf()
+
+
+def test_from_nodes_columnar(hierarchical_sine_data):
+    hier = {
+        "total": ["a", "b", "c"],
+        "a": ["a_x", "a_y"],
+        "b": ["b_x", "b_y"],
+        "c": ["c_x", "c_y"],
+    }
+    df = hierarchical_sine_data.head(50)
+    ht = HierarchyTree.from_nodes(hier, df)
+    columnar = HierarchyTree.from_nodes(hier, df, columnar=True)
+    store = columnar._store
+
+    for node in make_iterable(columnar, prop=None):
+        assert numpy.shares_memory(node.item.values, store.values)
+        pandas.testing.assert_frame_equal(
+            node.item, ht.get_node(node.key).item, check_freq=False
+        )
+    expected = ht.to_pandas()
+    restored = pickle.loads(pickle.dumps(columnar))
+    for tree in [columnar, restored]:
+        pandas.testing.assert_frame_equal(tree.to_pandas(), expected, check_freq=False)
+    assert numpy.shares_memory(columnar.to_pandas().values, store.values)
+
+    # Updates of the data of a node are reflected by the whole tree
+    node = columnar.get_node("a_x")
+    node.item["a_x"] = node.item["a_x"] * 2
+    numpy.testing.assert_allclose(
+        columnar.to_pandas()["a_x"].values, 2 * expected["a_x"].values
+    )
+
+    exogenous = {"a_x": ["b"]}
+    with_exog = HierarchyTree.from_nodes(hier, df, exogenous=exogenous, columnar=True)
+    assert list(with_exog.get_node("a_x").item.columns) == ["a_x", "b"]
+
+    # Exogenous variables directly follow their node, so its frame is a view too
+    exogenous = {"a_x": ["b_x_1"], "c": ["c_y_2", "c_x_1"]}
+    df = hierarchical_sine_data.head(50)
+    with_exog = HierarchyTree.from_nodes(hier, df, exogenous=exogenous, columnar=True)
+    for key in ["a_x", "c"]:
+        item = with_exog.get_node(key).item
+        assert list(item.columns) == [key] + exogenous[key]
+        assert all(with_exog._store.is_view(item, col) for col in item.columns)
+    pandas.testing.assert_frame_equal(
+        with_exog.to_pandas(),
+        HierarchyTree.from_nodes(hier, df, exogenous=exogenous).to_pandas(),
+        check_freq=False,
+    )
+
+
+def test_compact_nodes(n_tree):
+    node = n_tree.get_node("ab")
+    assert not hasattr(node, "__dict__")
+    assert node._visualizer is None
+    assert node.visualizer.tree is node
+    assert node.key is sys.intern("".join(["a", "b"]))
+
+    restored = pickle.loads(pickle.dumps(n_tree))
+    assert repr(restored) == repr(n_tree)
+    assert restored.get_node("ab")._visualizer is None
+    assert restored.get_node("aba").parent is restored.get_node("ab")
+
+    # State pickled before nodes had slots
+    legacy = HierarchyTree.__new__(HierarchyTree)
+    legacy.__setstate__(
+        {"key": "x", "item": 1, "exogenous": [], "children": [], "_parent": None}
+    )
+    assert legacy.item == 1
+    assert legacy.is_leaf()
+
+
+def test_geo_events_groupify():
+    rng = numpy.random.RandomState(0)
+    n_events = 400
+    city = rng.choice(["berlin", "hamburg"], n_events)
+    center = (
+        numpy.where(city == "berlin", 52.52, 53.55),
+        numpy.where(city == "berlin", 13.40, 9.99),
+    )
+    events = pandas.DataFrame(
+        {
+            "lat": center[0] + rng.normal(0, 0.03, n_events),
+            "lon": center[1] + rng.normal(0, 0.03, n_events),
+            "city": city,
+        },
+        index=pandas.Timestamp("2019-12-06")
+        + pandas.to_timedelta(rng.randint(0, 48 * 3600, n_events), unit="s"),
+    ).sort_index()
+
+    ht = HierarchyTree.from_geo_events(
+        df=events.copy(),
+        lat_col="lat",
+        lon_col="lon",
+        nodes=("city", "hex_index_6", "hex_index_7"),
+        levels=(6, 7),
+        min_count=3,
+    )
+    hexified = hexify(events.copy(), "lat", "lon", levels=(6, 7))
+    assert [c.key for c in ht.children] == list(events["city"].unique())
+    levels = [("hex_index_6", "city"), ("hex_index_7", "hex_index_6")]
+    for level, parent_level in levels:
+        for key, rows in hexified.groupby(level):
+            node = ht.get_node(key)
+            if len(rows) < 3:
+                assert node is None
+                continue
+            pandas.testing.assert_frame_equal(
+                node.item, resample_count(rows, "1H", key), check_freq=False
+            )
+            parent = rows[parent_level].value_counts()
+            assert parent[node.parent.key] == parent.max()
+
+
+def test_groupify_repeated_keys():
+    index = pandas.date_range("2019-12-06", periods=6, freq="1H")
+    events = pandas.DataFrame(
+        {
+            "city": ["a", "a", "b", "b", "b", "c"],
+            "district": ["b", "b", "d", "d", "d", "e"],
+            "street": ["s1", "s1", "s2", "s2", "s2", "s3"],
+        },
+        index=index,
+    )
+    root = HierarchyTree(key="total", item=resample_count(events, "1H", "total"))
+    root.add_child(key="c", item=resample_count(events.head(1), "1H", "c"))
+
+    ht = groupify(
+        root,
+        events,
+        nodes=("city", "district", "street"),
+        min_count=1,
+        total=root.item,
+    )
+    # Repeated keys resolve to the first node with that key in level order
+    first_c, city_a, city_b, city_c = ht.children
+    assert [n.key for n in ht.children] == ["c", "a", "b", "c"]
+    assert [n.key for n in first_c.children] == ["e"]
+    assert [n.key for n in first_c.children[0].children] == ["s3"]
+    assert city_c.is_leaf()
+    district_b = city_a.children[0]
+    assert district_b.key == "b" and district_b.is_leaf()
+    assert [n.key for n in city_b.children] == ["d", "s1"]
+    assert [n.key for n in city_b.children[0].children] == ["s2"]
+
+
+def test_hexify(events):
+    from h3 import h3
+
+    events = pandas.concat([events, events])
+    hexified = hexify(events.copy(), "start_latitude", "start_longitude", levels=(6, 8))
+    for lat, lon, cell in hexified[
+        ["start_latitude", "start_longitude", "hex_index_8"]
+    ].values:
+        assert cell == h3.geo_to_h3(lat, lon, 8)
+    for r in [6, 7]:
+        assert all(
+            h3.h3_to_parent(cell, r) == parent
+            for cell, parent in hexified[["hex_index_8", f"hex_index_{r}"]].values
+        )
+
+    parallel = hexify(
+        events.copy(), "start_latitude", "start_longitude", levels=(6, 8), n_jobs=2
+    )
+    pandas.testing.assert_frame_equal(parallel, hexified)
+
+    # Missing coordinates are indexed as '0' at every resolution
+    missing = events.copy()
+    missing.iloc[[0, 5], missing.columns.get_loc("start_latitude")] = numpy.nan
+    with_missing = hexify(missing, "start_latitude", "start_longitude", levels=(6, 8))
+    for r in [6, 7, 8]:
+        column = with_missing[f"hex_index_{r}"].values
+        assert list(column[[0, 5]]) == ["0", "0"]
+        mask = numpy.ones(len(column), dtype=bool)
+        mask[[0, 5]] = False
+        assert list(column[mask]) == list(hexified[f"hex_index_{r}"].values[mask])
+
+
+def test_save_load(hierarchical_sine_data, n_tree, tmp_path):
+    hier = {
+        "total": ["a", "b", "c"],
+        "a": ["a_x", "a_y"],
+        "b": ["b_x", "b_y"],
+        "c": ["c_x", "c_y"],
+    }
+    df = hierarchical_sine_data.head(50)
+    path = str(tmp_path / "tree.hts")
+
+    for exogenous in [None, {"total": ["a"], "a_x": ["b", "c"], "b_y": ["b"]}]:
+        for columnar in [False, True]:
+            ht = HierarchyTree.from_nodes(
+                hier, df, exogenous=exogenous, columnar=columnar
+            )
+            ht.save(path)
+            loaded = HierarchyTree.load(path)
+            assert loaded.get_level_order_labels() == ht.get_level_order_labels()
+            for node in make_iterable(loaded, prop=None):
+                expected = ht.get_node(node.key)
+                assert node.exogenous == expected.exogenous
+                pandas.testing.assert_frame_equal(
+                    node.item, expected.item, check_freq=False
+                )
+                assert isinstance(node.item.index, pandas.DatetimeIndex)
+            pandas.testing.assert_frame_equal(
+                loaded.to_pandas(), ht.to_pandas(), check_freq=False
+            )
+
+    # Node data are views of the mapped file, edits never reach the file
+    values = loaded.get_node("a_y").item.values
+    assert isinstance(loaded._store.values, numpy.memmap)
+    assert numpy.shares_memory(values, loaded._store.values)
+    loaded.get_node("a_y").item["a_y"] = 0.0
+    assert (HierarchyTree.load(path).get_node("a_y").item["a_y"] != 0.0).all()
+    in_memory = HierarchyTree.load(path, mmap_mode=None)
+    assert not isinstance(in_memory._store.values, numpy.memmap)
+
+    # Exogenous variables are written right after their node, so are mapped too
+    HierarchyTree.from_nodes(hier, df, exogenous={"a_x": ["b_x_1"]}).save(path)
+    loaded = HierarchyTree.load(path)
+    item = loaded.get_node("a_x").item
+    assert list(item.columns) == ["a_x", "b_x_1"]
+    assert all(loaded._store.is_view(item, col) for col in item.columns)
+
+    # Nodes covering different ranges of the index
+    index = pandas.date_range("2021-01-01", periods=10, freq="D")
+    frame = pandas.DataFrame({"x": numpy.arange(10.0)}, index=index)
+    tree = HierarchyTree(key="x", item=frame)
+    tree.add_child(key="y", item=frame.rename(columns={"x": "y"}).iloc[2:6])
+    tree.add_child(key="z", item=frame.rename(columns={"x": "z"}).iloc[5:])
+    tree.save(path)
+    loaded = HierarchyTree.load(path)
+    for node in make_iterable(loaded, prop=None):
+        pandas.testing.assert_frame_equal(
+            node.item, tree.get_node(node.key).item, check_freq=False
+        )
+    assert loaded.get_node("y").item.index[0] == index[2]
+
+    with pytest.raises(InvalidArgumentException):
+        n_tree.save(path)
+
+
+def test_append(hierarchical_sine_data):
+    hier = {
+        "total": ["a", "b", "c"],
+        "a": ["a_x", "a_y"],
+        "b": ["b_x", "b_y"],
+        "c": ["c_x", "c_y"],
+    }
+    exogenous = {"a_x": ["b"]}
+    df = hierarchical_sine_data.head(50)
+    expected = HierarchyTree.from_nodes(hier, df, exogenous=exogenous)
+    leaves = ["a_x", "a_y", "b_x", "b_y", "c_x", "c_y", "b"]
+
+    for columnar in [False, True]:
+        ht = HierarchyTree.from_nodes(
+            hier, df.head(40), exogenous=exogenous, columnar=columnar
+        )
+        ht.append(df.iloc[40:45])
+        # Aggregates are computed from the leaves
+        ht.append(df.iloc[45:][leaves])
+        for node in make_iterable(ht, prop=None):
+            pandas.testing.assert_frame_equal(
+                node.item, expected.get_node(node.key).item, check_freq=False
+            )
+        pandas.testing.assert_frame_equal(
+            ht.to_pandas(), expected.to_pandas(), check_freq=False
+        )
+
+        with pytest.raises(InvalidArgumentException):
+            ht.append(df.tail(2))
+        with pytest.raises(InvalidArgumentException):
+            ht.append(df.tail(2)[["a_x"]])
+        with pytest.raises(InvalidArgumentException):
+            ht.get_node("a").append(df.tail(2))
+
+    # Rows are written in the spare capacity of the store
+    store = ht._store
+    assert numpy.shares_memory(ht.get_node("b_y").item.values, store.values)
+    buffer = store._buffer
+    extra = df.tail(1).copy()
+    extra.index = extra.index + pandas.Timedelta(days=1000)
+    ht.append(extra)
+    assert store._buffer is buffer
+    assert len(ht.get_node("b_y").item) == 51
+    assert len(pickle.loads(pickle.dumps(store))._buffer) == 51
+
+
+def test_from_bottom(hierarchical_sine_data):
+    hier = {
+        "total": ["a", "b", "c"],
+        "a": ["a_x", "a_y"],
+        "b": ["b_x", "b_y"],
+        "c": ["c_x", "c_y"],
+    }
+    df = hierarchical_sine_data.head(50)
+    leaves = df[["a_x", "a_y", "b_x", "b_y", "c_x", "c_y"]]
+    expected = HierarchyTree.from_nodes(hier, df)
+
+    for exogenous in [None, {"total": ["b_x"], "a": ["a_x", "total"]}]:
+        for columnar in [False, True]:
+            ht = HierarchyTree.from_bottom(
+                hier, leaves, exogenous=exogenous, columnar=columnar
+            )
+            assert ht.get_level_order_labels() == expected.get_level_order_labels()
+            for node in make_iterable(expected, prop=None):
+                numpy.testing.assert_allclose(
+                    ht.get_node(node.key).get_series(), node.get_series()
+                )
+            if exogenous:
+                node = ht.get_node("a")
+                assert list(node.item.columns) == ["a", "a_x", "total"]
+                numpy.testing.assert_allclose(node.item["total"], df["total"].values)
+
+    columnar = HierarchyTree.from_bottom(hier, leaves, columnar=True)
+    assert numpy.shares_memory(columnar.to_pandas().values, columnar._store.values)
+
+    with pytest.raises(InvalidArgumentException):
+        HierarchyTree.from_bottom(hier, leaves.drop(columns=["c_y"]))
+    with pytest.raises(MissingRegressorException):
+        HierarchyTree.from_bottom(hier, leaves, exogenous={"a": ["temp"]})
+
+
+def test_detached(hierarchical_sine_data):
+    hier = {
+        "total": ["a", "b", "c"],
+        "a": ["a_x", "a_y"],
+        "b": ["b_x", "b_y"],
+        "c": ["c_x", "c_y"],
+    }
+    ht = HierarchyTree.from_nodes(hier, hierarchical_sine_data, columnar=True)
+    node = ht.get_node("a")
+    detached = node.detached()
+    assert detached.key == "a"
+    assert detached.children == [] and detached.parent is None
+    assert detached._store is None
+    assert detached.item is node.item
+
+    restored = pickle.loads(pickle.dumps(detached))
+    pandas.testing.assert_frame_equal(restored.item, node.item)
+    assert len(pickle.dumps(detached)) < len(pickle.dumps(node)) / 5
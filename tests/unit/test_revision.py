@@ -1,7 +1,17 @@
 import numpy
+import pandas
+import pytest
+from scipy import sparse
 
 from hts import HTSRegressor
-from hts.revision import RevisionMethod
+from hts.core.exceptions import InvalidArgumentException
+from hts.functions import (
+    apply_combination,
+    optimal_projection,
+    to_sparse_sum_mat,
+    to_sum_mat,
+)
+from hts.revision import ProjectionCache, RevisionMethod, fingerprint
 
 
 def test_instantiate_revision(load_df_and_hier_visnights):
@@ -19,3 +29,147 @@ def test_instantiate_revision(load_df_and_hier_visnights):
         )
         assert isinstance(revised, numpy.ndarray)
         assert revised.shape == (11, len(ht.hts_result.forecasts))
+
+        # Every method, FP included, writes to a preallocated buffer
+        out = numpy.empty(revised.shape)
+        written = rm.revise(
+            forecasts=ht.hts_result.forecasts,
+            mse=ht.hts_result.errors,
+            nodes=ht.nodes,
+            out=out,
+        )
+        assert written is out
+        numpy.testing.assert_allclose(out, revised)
+
+
+def test_revision_sparse_sum_mat(load_df_and_hier_visnights):
+    hierarchical_visnights_data, visnights_hier = load_df_and_hier_visnights
+
+    for method in ["OLS", "WLSS", "WLSV", "BU"]:
+        ht = HTSRegressor(
+            model="holt_winters", revision_method=method, sparse_sum_mat=True
+        )
+        ht.fit(df=hierarchical_visnights_data, nodes=visnights_hier)
+        revised = ht.predict(steps_ahead=3)
+
+        assert sparse.issparse(ht.sum_mat)
+        assert revised.shape == (11, len(ht.hts_result.forecasts))
+        # Reconciled forecasts are coherent
+        numpy.testing.assert_allclose(
+            revised["total"], revised[visnights_hier["total"]].sum(axis=1)
+        )
+        numpy.testing.assert_allclose(
+            revised["NSW"], revised[visnights_hier["NSW"]].sum(axis=1)
+        )
+
+
+def test_projection_cache(uv_tree):
+    dense, _ = to_sum_mat(uv_tree)
+    sum_mat, labels = to_sparse_sum_mat(uv_tree)
+    assert fingerprint(sum_mat) == fingerprint(sum_mat.tocoo())
+    assert fingerprint(dense) == fingerprint(dense.astype(int))
+    assert fingerprint(dense) != fingerprint(dense[::-1])
+
+    cache = ProjectionCache(maxsize=2)
+    ols = cache.get(sum_mat, method="OLS")
+    hat_mat = numpy.random.rand(4, len(labels))
+    numpy.testing.assert_allclose(
+        apply_combination(hat_mat, sum_mat, ols),
+        hat_mat @ optimal_projection(sum_mat, method="OLS").T,
+    )
+    assert cache.get(sum_mat.copy(), method="OLS") is ols
+    assert cache.info().hits == 1
+    assert cache.info().misses == 1
+
+    mse = {label: float(i + 1) for i, label in enumerate(labels)}
+    wlsv = cache.get(sum_mat, method="WLSV", mse=mse)
+    assert cache.get(sum_mat, method="WLSV", mse=dict(mse)) is wlsv
+    assert cache.get(sum_mat, method="WLSV", mse={k: 1.0 for k in mse}) is not wlsv
+    # Least recently used entry was evicted
+    assert cache.info().currsize == 2
+    assert cache.get(sum_mat, method="OLS") is not ols
+    assert cache.info() == (2, 4, 2, 2)
+
+    cache.clear()
+    assert cache.info() == (0, 0, 2, 0)
+
+
+def test_revision_uses_cache(uv_tree):
+    sum_mat, labels = to_sparse_sum_mat(uv_tree)
+    forecasts = {
+        label: pandas.DataFrame({"yhat": numpy.random.rand(5)}) for label in labels
+    }
+    cache = ProjectionCache()
+    rm = RevisionMethod("WLSS", sum_mat=sum_mat, transformer=None, cache=cache)
+
+    first = rm.revise(forecasts=forecasts)
+    second = rm.revise(forecasts=forecasts)
+    numpy.testing.assert_allclose(first, second)
+    assert cache.info().hits == 1
+    assert cache.info().misses == 1
+
+    uncached = RevisionMethod("WLSS", sum_mat=sum_mat, transformer=None, cache=None)
+    numpy.testing.assert_allclose(uncached.revise(forecasts=forecasts), first)
+
+
+def test_revise_batch(uv_tree):
+    sum_mat, labels = to_sparse_sum_mat(uv_tree)
+    batch = numpy.random.rand(3, 5, len(labels))
+
+    for method in ["OLS", "WLSS", "BU", "NONE"]:
+        rm = RevisionMethod(method, sum_mat=sum_mat, transformer=None, cache=None)
+        revised = rm.revise_batch(batch, labels=labels)
+        assert revised.values.shape == batch.shape
+        assert revised.labels == labels
+        for scenario in range(batch.shape[0]):
+            forecasts = {
+                label: pandas.DataFrame({"yhat": batch[scenario, :, i]})
+                for i, label in enumerate(labels)
+            }
+            numpy.testing.assert_allclose(
+                revised.values[scenario], rm.revise(forecasts=forecasts)
+            )
+
+    rm = RevisionMethod("OLS", sum_mat=sum_mat, transformer=None, cache=None)
+    out = numpy.empty(batch.shape)
+    assert rm.revise_batch(batch, out=out).values is out
+    with pytest.raises(InvalidArgumentException):
+        rm.revise_batch(batch[:, :, 1:])
+    with pytest.raises(InvalidArgumentException):
+        rm.revise_batch(batch, labels=labels[1:])
+    with pytest.raises(InvalidArgumentException):
+        RevisionMethod("FP", sum_mat=sum_mat, transformer=None).revise_batch(batch)
+
+
+def test_revision_mint(load_df_and_hier_uv, load_df_and_hier_visnights):
+    hierarchical_sine_data, sine_hier = load_df_and_hier_uv
+    hierarchical_visnights_data, visnights_hier = load_df_and_hier_visnights
+
+    for method, df, hier in [
+        ("MINT_SAMPLE", hierarchical_sine_data.head(200), sine_hier),
+        ("MINT_SHRINK", hierarchical_sine_data.head(200), sine_hier),
+        ("MINT_SHRINK", hierarchical_visnights_data, visnights_hier),
+    ]:
+        ht = HTSRegressor(
+            model="holt_winters", revision_method=method, sparse_sum_mat=True
+        )
+        ht.fit(df=df, nodes=hier)
+        revised = ht.predict(steps_ahead=3)
+
+        assert revised.shape == (len(df) + 3, len(ht.hts_result.forecasts))
+        numpy.testing.assert_allclose(
+            revised["total"], revised[hier["total"]].sum(axis=1)
+        )
+
+        # The default dense summing matrix gives the same reconciliation
+        dense = HTSRegressor(model="holt_winters", revision_method=method)
+        dense.fit(df=df, nodes=hier)
+        assert not sparse.issparse(dense.sum_mat)
+        pandas.testing.assert_frame_equal(dense.predict(steps_ahead=3), revised)
+
+    ht = HTSRegressor(
+        model="holt_winters", revision_method="MINT_SAMPLE", sparse_sum_mat=True
+    )
+    ht.fit(df=hierarchical_visnights_data, nodes=visnights_hier)
+    with pytest.raises(ValueError):
+        ht.predict(steps_ahead=3)